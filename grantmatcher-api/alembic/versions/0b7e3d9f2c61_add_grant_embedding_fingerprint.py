@@ -0,0 +1,69 @@
+"""add grant embedding fingerprint
+
+Revision ID: 0b7e3d9f2c61
+Revises: f2d6b8c41e57
+Create Date: 2026-10-17 19:41:27.503116
+
+Existing embeddings are assumed to match their grant's current text and are fingerprinted
+in place (with the text recipe of ingestion.embeddings.grant_text as of this revision), so
+the first embedding run after the upgrade does not re-embed the whole corpus.
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b7e3d9f2c61'
+down_revision: Union[str, Sequence[str], None] = 'f2d6b8c41e57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK = 1000
+
+grants = sa.table(
+    'grants',
+    sa.column('id', sa.String),
+    sa.column('title', sa.String),
+    sa.column('description', sa.Text),
+    sa.column('focus_areas', sa.JSON),
+    sa.column('embedding_data', sa.JSON),
+    sa.column('embedding_model', sa.String),
+    sa.column('embedding_fingerprint', sa.String),
+)
+
+
+def _fingerprint(row) -> str:
+    text = f"{row.title} {row.description}"
+    if row.focus_areas:
+        text += " " + " ".join(row.focus_areas)
+    return hashlib.sha256(f"{row.embedding_model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('grants', sa.Column('embedding_fingerprint', sa.String(length=64), nullable=True))
+
+    bind = op.get_bind()
+    last_id = ''
+    while True:
+        rows = bind.execute(
+            sa.select(grants.c.id, grants.c.title, grants.c.description, grants.c.focus_areas, grants.c.embedding_model)
+            .where(grants.c.embedding_data.isnot(None), grants.c.embedding_model.isnot(None), grants.c.id > last_id)
+            .order_by(grants.c.id)
+            .limit(BACKFILL_CHUNK)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            grants.update().where(grants.c.id == sa.bindparam('grant_id')),
+            [{'grant_id': row.id, 'embedding_fingerprint': _fingerprint(row)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('grants', 'embedding_fingerprint')
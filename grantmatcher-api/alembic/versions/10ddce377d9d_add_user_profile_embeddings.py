@@ -0,0 +1,32 @@
+"""add user profile embeddings
+
+Revision ID: 10ddce377d9d
+Revises: a8c119f956ee
+Create Date: 2026-10-17 09:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10ddce377d9d'
+down_revision: Union[str, Sequence[str], None] = 'a8c119f956ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('embedding', sa.LargeBinary(), nullable=True))
+    op.add_column('users', sa.Column('embedding_fingerprint', sa.String(length=64), nullable=True))
+    op.add_column('users', sa.Column('embedding_model', sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'embedding_model')
+    op.drop_column('users', 'embedding_fingerprint')
+    op.drop_column('users', 'embedding')
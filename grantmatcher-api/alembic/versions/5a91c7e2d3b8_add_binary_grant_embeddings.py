@@ -0,0 +1,174 @@
+"""add binary grant embeddings
+
+Revision ID: 5a91c7e2d3b8
+Revises: 0b7e3d9f2c61
+Create Date: 2026-10-17 21:08:36.224719
+
+Adds grants.embedding (little-endian float32 after an 8-byte header, the format of
+ingestion/vector_codec.py as of this revision, ~1.5 KB per 384-dim grant instead of ~8 KB of JSON) and moves every well-formed
+embedding_data list into it, clearing the JSON. Conversion runs in id-ordered chunks that
+each commit on their own; re-running the upgrade resumes with the rows still in JSON.
+Readers accept both columns, so rows written as JSON by older code keep working.
+
+PostgreSQL: the embedding_vector trigger learns to decode the binary column, so pgvector
+search stays in sync with both formats.
+
+GRANT_EMBEDDING_MIGRATION_CHUNK sets the rows converted per transaction.
+"""
+import os
+import struct
+from typing import Sequence, Union
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a91c7e2d3b8'
+down_revision: Union[str, Sequence[str], None] = '0b7e3d9f2c61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIM = 384
+CHUNK = int(os.getenv("GRANT_EMBEDDING_MIGRATION_CHUNK", "1000"))
+
+# Binary column format, inlined so later codec changes do not alter this migration:
+# magic b"GV", format version 1, dtype 1 (float32), dim (uint32), then little-endian float32 values
+HEADER = struct.Struct("<2sBBI")
+
+grants = sa.table(
+    'grants',
+    sa.column('id', sa.String),
+    sa.column('embedding', sa.LargeBinary),
+    sa.column('embedding_data', sa.JSON(none_as_null=True)),
+)
+
+# float32 little-endian after the 8-byte header (b"GV", version 1, dtype 1, dim) -> vector.
+# SQL, so the trigger needs no extension beyond pgvector; malformed values give NULL.
+DECODE_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION grant_embedding_to_vector(data bytea) RETURNS vector AS $$
+        SELECT CASE WHEN length(data) = 8 + 4 * {DIM} AND substring(data FROM 1 FOR 4) = decode('47560101', 'hex') THEN (
+            SELECT array_agg(
+                CASE WHEN e = 0 THEN (1 - 2 * s) * m * power(2::float8, -149)
+                     ELSE (1 - 2 * s) * (1 + m::float8 / 8388608) * power(2::float8, e - 127) END
+                ORDER BY i
+            )::real[]::vector({DIM})
+            FROM (
+                SELECT i, (b >> 31) & 1 AS s, (b >> 23) & 255 AS e, b & 8388607 AS m
+                FROM (
+                    SELECT i, get_byte(data, 8 + 4 * i)::bigint
+                            + (get_byte(data, 9 + 4 * i)::bigint << 8)
+                            + (get_byte(data, 10 + 4 * i)::bigint << 16)
+                            + (get_byte(data, 11 + 4 * i)::bigint << 24) AS b
+                    FROM generate_series(0, {DIM - 1}) AS i
+                ) words
+            ) fields
+        ) END
+    $$ LANGUAGE sql IMMUTABLE STRICT
+"""
+
+# Same JSON check as d4a7e1b05c83
+VALID_EMBEDDING = f"CASE WHEN json_typeof({{0}}::json) = 'array' THEN json_array_length({{0}}::json) = {DIM} ELSE false END"
+
+
+def _sync_function(binary: bool) -> str:
+    binary_branch = """
+            IF NEW.embedding IS NOT NULL THEN
+                NEW.embedding_vector := grant_embedding_to_vector(NEW.embedding);
+            ELSIF""" if binary else """
+            IF"""
+    return f"""
+        CREATE OR REPLACE FUNCTION grants_sync_embedding_vector() RETURNS trigger AS $$
+        BEGIN{binary_branch} NEW.embedding_data IS NOT NULL AND {VALID_EMBEDDING.format('NEW.embedding_data')} THEN
+                NEW.embedding_vector := CAST(NEW.embedding_data::text AS vector({DIM}));
+            ELSE
+                NEW.embedding_vector := NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """
+
+
+def _install_trigger(columns: str):
+    op.execute("DROP TRIGGER IF EXISTS grants_sync_embedding_vector ON grants")
+    op.execute(f"""
+        CREATE TRIGGER grants_sync_embedding_vector
+        BEFORE INSERT OR UPDATE OF {columns} ON grants
+        FOR EACH ROW EXECUTE FUNCTION grants_sync_embedding_vector()
+    """)
+
+
+def _has_pgvector(bind) -> bool:
+    return bind.dialect.name == 'postgresql' and bind.execute(sa.text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = 'grants' AND column_name = 'embedding_vector'"
+    )).first() is not None
+
+
+def _convert(bind, where, convert) -> int:
+    """Rewrite rows matching where in id-ordered chunks; rows convert() rejects are left as they are"""
+    converted, last_id = 0, ''
+    while True:
+        rows = bind.execute(
+            sa.select(grants.c.id, grants.c.embedding, grants.c.embedding_data)
+            .where(where, grants.c.id > last_id)
+            .order_by(grants.c.id)
+            .limit(CHUNK)
+        ).all()
+        if not rows:
+            return converted
+        values = [value for value in (convert(row) for row in rows) if value is not None]
+        if values:
+            bind.execute(
+                grants.update().where(grants.c.id == sa.bindparam('grant_id')),
+                values,
+            )
+            converted += len(values)
+        last_id = rows[-1].id
+
+
+def _to_binary(row):
+    try:
+        vector = np.asarray(row.embedding_data, dtype='<f4')
+    except (TypeError, ValueError):
+        return None
+    if vector.ndim != 1 or vector.size == 0:
+        return None
+    encoded = HEADER.pack(b'GV', 1, 1, vector.size) + vector.tobytes()
+    return {'grant_id': row.id, 'embedding': encoded, 'embedding_data': None}
+
+
+def _to_json(row):
+    dim = HEADER.unpack_from(row.embedding)[3]
+    values = np.frombuffer(row.embedding, dtype='<f4', offset=HEADER.size, count=dim)
+    return {'grant_id': row.id, 'embedding': None, 'embedding_data': values.tolist()}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('grants', sa.Column('embedding', sa.LargeBinary(), nullable=True))
+
+    bind = op.get_bind()
+
+    if _has_pgvector(bind):
+        op.execute(DECODE_FUNCTION)
+        op.execute(_sync_function(binary=True))
+        _install_trigger("embedding_data, embedding")
+
+    # Chunks commit on their own so a large table is not rewritten (and locked) in one go
+    with op.get_context().autocommit_block():
+        _convert(bind, sa.and_(grants.c.embedding.is_(None), grants.c.embedding_data.isnot(None)), _to_binary)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        _convert(bind, sa.and_(grants.c.embedding.isnot(None), grants.c.embedding_data.is_(None)), _to_json)
+
+    if _has_pgvector(bind):
+        op.execute(_sync_function(binary=False))
+        _install_trigger("embedding_data")
+        op.execute("DROP FUNCTION IF EXISTS grant_embedding_to_vector(bytea)")
+    op.drop_column('grants', 'embedding')
@@ -0,0 +1,30 @@
+"""add rank to match results
+
+Revision ID: 5e0b7c41d2a9
+Revises: 10ddce377d9d
+Create Date: 2026-10-17 11:03:27.540118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0b7c41d2a9'
+down_revision: Union[str, Sequence[str], None] = '10ddce377d9d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('match_results', sa.Column('rank', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index('ix_match_results_user_rank', 'match_results', ['user_id', 'rank'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_match_results_user_rank', table_name='match_results')
+    op.drop_column('match_results', 'rank')
@@ -0,0 +1,28 @@
+"""add user data version
+
+Revision ID: c3f9a2e67b10
+Revises: 5e0b7c41d2a9
+Create Date: 2026-10-17 13:26:05.114392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f9a2e67b10'
+down_revision: Union[str, Sequence[str], None] = '5e0b7c41d2a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'data_version')
@@ -0,0 +1,104 @@
+"""add pgvector embedding column
+
+Revision ID: d4a7e1b05c83
+Revises: c3f9a2e67b10
+Create Date: 2026-10-17 14:20:51.093412
+
+PostgreSQL only (a no-op on SQLite, which keeps ranking the JSON embeddings in memory).
+Adds grants.embedding_vector vector(384), backfills it from embedding_data in chunks
+that each commit on their own, builds the ANN index and installs a trigger that keeps
+the column in sync with every later write to embedding_data.
+
+GRANT_PGVECTOR_INDEX=hnsw (default) or ivfflat picks the index type;
+GRANT_PGVECTOR_BACKFILL_CHUNK sets the rows updated per backfill transaction.
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7e1b05c83'
+down_revision: Union[str, Sequence[str], None] = 'c3f9a2e67b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIM = 384
+INDEX_TYPE = os.getenv("GRANT_PGVECTOR_INDEX", "hnsw")
+BACKFILL_CHUNK = int(os.getenv("GRANT_PGVECTOR_BACKFILL_CHUNK", "2000"))
+
+# Only well-formed 384-dim JSON arrays are cast; anything else stays NULL (and unsearchable)
+# (CASE because PostgreSQL does not promise to evaluate AND left to right)
+VALID_EMBEDDING = f"CASE WHEN json_typeof({{0}}::json) = 'array' THEN json_array_length({{0}}::json) = {DIM} ELSE false END"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.execute(f"ALTER TABLE grants ADD COLUMN IF NOT EXISTS embedding_vector vector({DIM})")
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION grants_sync_embedding_vector() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.embedding_data IS NOT NULL AND {VALID_EMBEDDING.format('NEW.embedding_data')} THEN
+                NEW.embedding_vector := CAST(NEW.embedding_data::text AS vector({DIM}));
+            ELSE
+                NEW.embedding_vector := NULL;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS grants_sync_embedding_vector ON grants")
+    op.execute("""
+        CREATE TRIGGER grants_sync_embedding_vector
+        BEFORE INSERT OR UPDATE OF embedding_data ON grants
+        FOR EACH ROW EXECUTE FUNCTION grants_sync_embedding_vector()
+    """)
+
+    # Backfill and index outside the migration transaction so a large table is not
+    # rewritten (and locked) in one go; re-running resumes where it stopped
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while True:
+            updated = bind.execute(sa.text(f"""
+                UPDATE grants SET embedding_vector = CAST(embedding_data::text AS vector({DIM}))
+                WHERE id IN (
+                    SELECT id FROM grants
+                    WHERE embedding_vector IS NULL AND embedding_data IS NOT NULL
+                      AND {VALID_EMBEDDING.format('embedding_data')}
+                    LIMIT :chunk
+                )
+            """), {"chunk": BACKFILL_CHUNK}).rowcount
+            if not updated:
+                break
+
+        if INDEX_TYPE == 'ivfflat':
+            # ~sqrt(rows) lists, as pgvector recommends for up to ~1M rows
+            rows = bind.execute(sa.text("SELECT count(*) FROM grants WHERE embedding_vector IS NOT NULL")).scalar()
+            lists = max(1, int(rows ** 0.5))
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_grants_embedding_vector ON grants "
+                f"USING ivfflat (embedding_vector vector_cosine_ops) WITH (lists = {lists})"
+            )
+        else:
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_grants_embedding_vector ON grants "
+                "USING hnsw (embedding_vector vector_cosine_ops)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS grants_sync_embedding_vector ON grants")
+    op.execute("DROP FUNCTION IF EXISTS grants_sync_embedding_vector()")
+    op.execute("DROP INDEX IF EXISTS ix_grants_embedding_vector")
+    op.execute("ALTER TABLE grants DROP COLUMN IF EXISTS embedding_vector")
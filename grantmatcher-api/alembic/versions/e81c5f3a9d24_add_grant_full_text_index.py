@@ -0,0 +1,68 @@
+"""add grant full-text index
+
+Revision ID: e81c5f3a9d24
+Revises: d4a7e1b05c83
+Create Date: 2026-10-17 15:02:13.618205
+
+PostgreSQL: a generated, weighted tsvector column (title A, agency B, description C)
+with a GIN index. SQLite: an external-content FTS5 table kept in sync by triggers.
+Both are maintained by the database on every insert/update, so ingestion needs no changes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81c5f3a9d24'
+down_revision: Union[str, Sequence[str], None] = 'd4a7e1b05c83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("""
+            ALTER TABLE grants ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(agency, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'C')
+            ) STORED
+        """)
+        op.create_index('ix_grants_search_vector', 'grants', ['search_vector'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS grants_fts USING fts5("
+            "title, description, agency, content='grants', content_rowid='rowid', tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS grants_fts_ai AFTER INSERT ON grants BEGIN "
+            "INSERT INTO grants_fts(rowid, title, description, agency) VALUES (new.rowid, new.title, new.description, new.agency); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS grants_fts_ad AFTER DELETE ON grants BEGIN "
+            "INSERT INTO grants_fts(grants_fts, rowid, title, description, agency) "
+            "VALUES ('delete', old.rowid, old.title, old.description, old.agency); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS grants_fts_au AFTER UPDATE OF title, description, agency ON grants BEGIN "
+            "INSERT INTO grants_fts(grants_fts, rowid, title, description, agency) "
+            "VALUES ('delete', old.rowid, old.title, old.description, old.agency); "
+            "INSERT INTO grants_fts(rowid, title, description, agency) VALUES (new.rowid, new.title, new.description, new.agency); END"
+        )
+        op.execute("INSERT INTO grants_fts(grants_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_grants_search_vector', table_name='grants')
+        op.drop_column('grants', 'search_vector')
+    elif dialect == 'sqlite':
+        for trigger in ('grants_fts_ai', 'grants_fts_ad', 'grants_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS grants_fts")
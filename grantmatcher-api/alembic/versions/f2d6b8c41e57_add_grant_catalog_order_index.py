@@ -0,0 +1,28 @@
+"""add grant catalog order index
+
+Revision ID: f2d6b8c41e57
+Revises: e81c5f3a9d24
+Create Date: 2026-10-17 15:41:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d6b8c41e57'
+down_revision: Union[str, Sequence[str], None] = 'e81c5f3a9d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_grants_catalog_order', 'grants', ['status', 'close_date', 'title', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_grants_catalog_order', table_name='grants')
@@ -0,0 +1,142 @@
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Use approximate recall once the corpus reaches this many grants (exact scoring below it)
+ANN_MIN_GRANTS = int(os.getenv("GRANT_ANN_MIN_GRANTS", "20000"))
+# Number of k-means cells; 0 picks ~4*sqrt(N)
+ANN_NLIST = int(os.getenv("GRANT_ANN_NLIST", "0"))
+# Cells scanned per query: higher = better recall, slower queries
+ANN_NPROBE = int(os.getenv("GRANT_ANN_NPROBE", "8"))
+# Candidates recalled by similarity before the hybrid boosts rerank them
+ANN_RECALL_K = int(os.getenv("GRANT_ANN_RECALL_K", "200"))
+# Snapshot file so startup does not retrain the coarse quantizer
+ANN_INDEX_PATH = os.getenv("GRANT_ANN_INDEX_PATH")
+# Grants used as probe queries when estimating recall@10 for the admin stats (0 skips it)
+ANN_RECALL_SAMPLES = int(os.getenv("GRANT_ANN_RECALL_SAMPLES", "32"))
+
+SNAPSHOT_VERSION = 1
+# Rows k-means is fitted on; larger corpora are sampled down to this
+ANN_TRAIN_SAMPLE = 100000
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) coarse quantizer for approximate grant recall.
+
+    Grant vectors are clustered with spherical k-means; each row is assigned to its
+    nearest centroid. A query only scans the rows in its nprobe closest cells, which
+    yields the "recall top-200" candidate set that the hybrid scorer then reranks.
+    """
+
+    def __init__(self, centroids: np.ndarray, trained_size: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.trained_size = trained_size
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int = 0, iterations: int = 10, max_sample: int = ANN_TRAIN_SAMPLE, seed: int = 0,
+              trained_size: Optional[int] = None) -> "IVFIndex":
+        """
+        Fit centroids with spherical k-means on (a sample of) L2-normalized vectors.
+        Pass trained_size when vectors is already a sample of a larger corpus; it sizes nlist.
+        """
+        start = time.perf_counter()
+        n = vectors.shape[0]
+        trained_size = trained_size or n
+        nlist = nlist or max(1, int(4 * np.sqrt(trained_size)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        sample_rows = rng.choice(n, size=min(n, max_sample), replace=False) if n > max_sample else np.arange(n)
+        sample = np.asarray(vectors[np.sort(sample_rows)], dtype=np.float32)
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = cls._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = np.flatnonzero(counts == 0)
+            if empty.size:
+                # Re-seed empty cells with random points so every cell stays useful
+                sums[empty] = sample[rng.choice(sample.shape[0], size=empty.size, replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            np.divide(sums, norms, out=sums, where=norms > 0)
+            centroids = sums
+
+        logger.info(f"Trained IVF quantizer with {nlist} cells on {sample.shape[0]} grants in {time.perf_counter() - start:.2f}s")
+        return cls(centroids, trained_size)
+
+    @staticmethod
+    def _nearest(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Return the cell id of each row (used for inserts as new grants are embedded)"""
+        if vectors.shape[0] == 0:
+            return np.zeros(0, dtype=np.int32)
+        return self._nearest(vectors, self.centroids)
+
+    def probe(self, query: np.ndarray, nprobe: int = ANN_NPROBE) -> np.ndarray:
+        """Cells closest to a normalized query, best first"""
+        nprobe = min(max(1, nprobe), self.nlist)
+        similarities = self.centroids @ query
+        cells = np.argpartition(-similarities, nprobe - 1)[:nprobe]
+        return cells[np.argsort(-similarities[cells])]
+
+    def save(self, path: str, ids: List[str], cells: np.ndarray):
+        """Persist centroids plus per-grant cell assignments (written atomically)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Per-process temporary file: workers retraining at the same time never share one
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=os.path.basename(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                version=np.int32(SNAPSHOT_VERSION),
+                centroids=self.centroids,
+                trained_size=np.int64(self.trained_size),
+                ids=np.asarray(ids, dtype=object).astype(str),
+                cells=np.asarray(cells, dtype=np.int32),
+            )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved IVF snapshot ({self.nlist} cells, {len(ids)} grants) to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional[Tuple["IVFIndex", List[str], np.ndarray]]:
+        """Load a snapshot written by save(); returns None if it is missing or incompatible"""
+        if not path or not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != SNAPSHOT_VERSION:
+                logger.warning(f"Ignoring IVF snapshot {path} with unsupported version {int(data['version'])}")
+                return None
+            index = cls(data["centroids"], int(data["trained_size"]))
+            return index, data["ids"].tolist(), data["cells"]
+
+
+def recall_at_k(exact_scores: np.ndarray, approximate_rows: np.ndarray, k: int = 10) -> float:
+    """Fraction of the exact top-k rows that the approximate search also returned"""
+    k = min(k, exact_scores.shape[0])
+    if k == 0:
+        return 1.0
+    exact_rows = np.argpartition(-exact_scores, k - 1)[:k]
+    return len(set(exact_rows.tolist()) & set(approximate_rows[:k].tolist())) / k
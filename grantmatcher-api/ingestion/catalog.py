@@ -0,0 +1,158 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+from models import Grant
+
+logger = logging.getLogger(__name__)
+
+# Distinct search strings whose totals are kept per process
+CATALOG_TOTALS_SIZE = int(os.getenv("GRANT_CATALOG_TOTALS_SIZE", "256"))
+# How long (seconds) the corpus version behind ETags is reused before re-reading it
+CORPUS_ETAG_SECONDS = float(os.getenv("GRANT_CORPUS_ETAG_SECONDS", "5"))
+
+# Catalog order; ix_grants_catalog_order covers it for the active-grant listing
+CATALOG_ORDER = (Grant.close_date.asc().nulls_last(), Grant.title.asc(), Grant.id.asc())
+
+Cursor = Tuple[Optional[datetime], str, str]
+
+
+def encode_cursor(grant: Any) -> str:
+    """Opaque cursor for the catalog position right after this grant"""
+    key = [grant.close_date.isoformat() if grant.close_date else None, grant.title, grant.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        close_date, title, grant_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(close_date) if close_date else None), str(title), str(grant_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def after_cursor(query: Query, cursor: Cursor) -> Query:
+    """Keyset filter: grants after the cursor in CATALOG_ORDER (close_date NULLS LAST, title, id)"""
+    close_date, title, grant_id = cursor
+    same_date_after = or_(Grant.title > title, and_(Grant.title == title, Grant.id > grant_id))
+    if close_date is None:
+        return query.filter(Grant.close_date.is_(None), same_date_after)
+    return query.filter(or_(
+        Grant.close_date > close_date,
+        and_(Grant.close_date == close_date, same_date_after),
+        Grant.close_date.is_(None),
+    ))
+
+
+class CatalogTotals:
+    """
+    Result counts of the grant catalog per search string, scoped to one corpus version.
+    A page request then only reads its own rows; the count runs once per search string
+    and corpus change instead of on every page.
+    """
+
+    def __init__(self, max_size: int = CATALOG_TOTALS_SIZE):
+        self.max_size = max_size
+        self.corpus_version: Optional[str] = None
+        self._totals: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, corpus_version: str, q: Optional[str], count: Callable[[], int]) -> int:
+        key = (q or "").strip().lower()
+        with self._lock:
+            if corpus_version != self.corpus_version:
+                self._totals.clear()
+                self.corpus_version = corpus_version
+            total = self._totals.get(key)
+            if total is not None:
+                self._totals.move_to_end(key)
+                self.hits += 1
+                return total
+            self.misses += 1
+
+        total = count()
+        with self._lock:
+            if corpus_version == self.corpus_version and self.max_size > 0:
+                self._totals[key] = total
+                while len(self._totals) > self.max_size:
+                    self._totals.popitem(last=False)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._totals), "hits": self.hits, "misses": self.misses}
+
+
+_totals: Optional[CatalogTotals] = None
+_totals_lock = threading.Lock()
+
+
+def get_catalog_totals() -> CatalogTotals:
+    """Process-wide cache of catalog result counts"""
+    global _totals
+    if _totals is None:
+        with _totals_lock:
+            if _totals is None:
+                _totals = CatalogTotals()
+    return _totals
+
+
+_etag_versions: Dict[str, Tuple[float, str]] = {}
+_etag_refreshing: set = set()
+_etag_lock = threading.Lock()
+
+
+def _read_etag_version(db: Session) -> str:
+    key = str(db.get_bind().url)
+    latest_update, latest_create, count = db.execute(
+        select(func.max(Grant.updated_at), func.max(Grant.created_at), func.count(Grant.id))
+    ).one()
+    stamps = [s for s in (latest_update, latest_create) if s is not None]
+    version = f"{max(stamps).isoformat() if stamps else ''}/{count}"
+    with _etag_lock:
+        _etag_versions[key] = (time.time(), version)
+    return version
+
+
+def _refresh_etag_version(bind: Engine, key: str):
+    try:
+        with Session(bind) as session:
+            _read_etag_version(session)
+    except Exception as e:
+        logger.warning(f"Could not refresh the corpus ETag version: {e}")
+    finally:
+        with _etag_lock:
+            _etag_refreshing.discard(key)
+
+
+def corpus_etag_version(db: Session) -> str:
+    """
+    Corpus version for HTTP ETags: latest grant write stamp and grant count. It is kept in
+    process memory; once older than GRANT_CORPUS_ETAG_SECONDS it is re-read by a background
+    thread while requests keep using the current value, so only a cold worker's first
+    request waits on the aggregate query. It covers every grant (embedded or not) and never
+    touches the search index.
+    """
+    key = str(db.get_bind().url)
+    cached = _etag_versions.get(key)
+    if cached is None:
+        return _read_etag_version(db)
+    if time.time() - cached[0] >= CORPUS_ETAG_SECONDS:
+        # One background re-read per database; the stale value is served meanwhile
+        with _etag_lock:
+            start = key not in _etag_refreshing
+            _etag_refreshing.add(key)
+        if start:
+            threading.Thread(target=_refresh_etag_version, args=(db.get_bind(), key), name="etag-version", daemon=True).start()
+    return cached[1]
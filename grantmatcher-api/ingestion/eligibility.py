@@ -0,0 +1,224 @@
+import logging
+import os
+import re
+import numpy as np
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Set GRANT_HARD_FILTERS=0 to score every active grant again (e.g. while debugging matches)
+HARD_FILTERS_ENABLED = os.getenv("GRANT_HARD_FILTERS", "1") != "0"
+
+# Canonical applicant types from MATCHING_LOGIC; bit i of a grant's mask = APPLICANT_TYPES[i]
+APPLICANT_TYPES = [
+    "nonprofit_501c3",
+    "nonprofit_other",
+    "higher_education",
+    "for_profit_small_business",
+    "for_profit_other",
+    "state_government",
+    "local_government",
+    "tribal_government",
+    "individual",
+]
+# Grants open to anyone ("Unrestricted", "Others") never fail the applicant-type filter
+UNRESTRICTED = "unrestricted"
+TYPE_BITS = {t: 1 << i for i, t in enumerate(APPLICANT_TYPES + [UNRESTRICTED])}
+
+# Which grant eligibility categories each user organization type may apply to
+TYPE_MAPPING = {
+    "nonprofit_501c3": ["nonprofit_501c3", "nonprofit_other"],
+    "nonprofit_other": ["nonprofit_other"],
+    "higher_education": ["higher_education"],
+    "for_profit_small_business": ["for_profit_small_business", "for_profit_other"],
+    "for_profit_other": ["for_profit_other"],
+    "state_government": ["state_government"],
+    "local_government": ["local_government"],
+    "tribal_government": ["tribal_government"],
+    "individual": ["individual"],
+}
+
+# organization_type values sent by the onboarding and profile pages
+USER_TYPE_ALIASES = {
+    "nonprofit": "nonprofit_501c3",
+    "academic": "higher_education",
+    "startup": "for_profit_small_business",
+    "social_startup": "for_profit_small_business",
+}
+USER_TYPE_GROUPS = {
+    "government": ["state_government", "local_government"],
+}
+
+# Grants.gov eligibility codes
+GRANTS_GOV_CODES = {
+    "00": ["state_government"],
+    "01": ["local_government"],
+    "02": ["local_government"],
+    "04": ["local_government"],
+    "05": ["local_government"],
+    "06": ["higher_education"],
+    "07": ["tribal_government"],
+    "08": ["local_government"],
+    "11": ["tribal_government"],
+    "12": ["nonprofit_501c3"],
+    "13": ["nonprofit_other"],
+    "20": ["higher_education"],
+    "21": ["individual"],
+    "22": ["for_profit_other"],
+    "23": ["for_profit_small_business"],
+    "25": [UNRESTRICTED],
+    "99": [UNRESTRICTED],
+}
+
+# Keyword rules for free-text applicant type descriptions, checked in order
+# (text after "other than" is dropped first, e.g. "for profit organizations other than small businesses")
+DESCRIPTION_RULES = [
+    (re.compile(r"unrestricted|^others?\b"), [UNRESTRICTED]),
+    (re.compile(r"higher education|universit|college"), ["higher_education"]),
+    (re.compile(r"do(es)? not have a 501|non-?501|without 501"), ["nonprofit_other"]),
+    (re.compile(r"501\s*\(?c\)?\s*\(?3\)?"), ["nonprofit_501c3"]),
+    (re.compile(r"non-?profit"), ["nonprofit_501c3", "nonprofit_other"]),
+    (re.compile(r"small business"), ["for_profit_small_business"]),
+    (re.compile(r"for[- ]?profit"), ["for_profit_other"]),
+    (re.compile(r"housing authorit"), ["local_government"]),
+    (re.compile(r"tribal|native american|indian"), ["tribal_government"]),
+    (re.compile(r"state gov"), ["state_government"]),
+    (re.compile(r"county|city|township|municipal|local gov|school district|special district"), ["local_government"]),
+    (re.compile(r"individual"), ["individual"]),
+]
+
+SBIR_PATTERN = re.compile(r"sbir|sttr", re.IGNORECASE)
+
+# Elimination reasons in the order the filters are applied
+FILTER_REASONS = [
+    "applicant_type_mismatch",
+    "deadline_passed",
+    "amount_too_low",
+    "amount_too_high",
+    "sbir_requires_small_business",
+]
+
+
+def normalize_applicant_types(value: Any) -> Set[str]:
+    """Map a grant's raw eligible_applicant_types entry (code, description, dict) to canonical types"""
+    if value is None:
+        return set()
+    if isinstance(value, dict):
+        types = set()
+        for key in ("id", "code", "description", "name"):
+            if value.get(key) is not None:
+                types |= normalize_applicant_types(value[key])
+        return types
+    if isinstance(value, (list, tuple, set)):
+        types = set()
+        for item in value:
+            types |= normalize_applicant_types(item)
+        return types
+
+    text = str(value).strip().lower()
+    if not text:
+        return set()
+    if text in TYPE_BITS:
+        return {text}
+    if text in GRANTS_GOV_CODES:
+        return set(GRANTS_GOV_CODES[text])
+    text = re.split(r"\bother than\b", text)[0]
+    for pattern, types in DESCRIPTION_RULES:
+        if pattern.search(text):
+            return set(types)
+    return set()
+
+
+def applicant_type_mask(eligible_applicant_types: Any) -> int:
+    """Bitmask of canonical applicant types for one grant (0 = unknown, never filtered)"""
+    mask = 0
+    for applicant_type in normalize_applicant_types(eligible_applicant_types):
+        mask |= TYPE_BITS[applicant_type]
+    return mask
+
+
+def is_sbir_program(program_name: Optional[str]) -> bool:
+    return bool(program_name and SBIR_PATTERN.search(program_name))
+
+
+def _parse_amount_ranges(ranges: List[str]) -> Tuple[Optional[int], Optional[int]]:
+    """'25000-100000' / '500000+' ranges from onboarding -> overall (min, max)"""
+    lows, highs, unbounded = [], [], False
+    for value in ranges or []:
+        try:
+            text = str(value).replace("$", "").replace(",", "").strip()
+            if text.endswith("+"):
+                lows.append(int(text[:-1]))
+                unbounded = True
+            else:
+                low, high = text.split("-", 1)
+                lows.append(int(low))
+                highs.append(int(high))
+        except (ValueError, TypeError):
+            continue
+    min_amount = min(lows) if lows else None
+    max_amount = None if unbounded or not highs else max(highs)
+    return min_amount, max_amount
+
+
+class UserFilter:
+    """A user's hard-filter inputs, resolved once per request"""
+
+    def __init__(self, user_profile: Optional[Dict[str, Any]]):
+        profile = user_profile or {}
+        user_type = profile.get("organization_type")
+        user_type = USER_TYPE_ALIASES.get(user_type, user_type)
+        if user_type in USER_TYPE_GROUPS:
+            allowed = [t for group in USER_TYPE_GROUPS[user_type] for t in TYPE_MAPPING[group]]
+        else:
+            allowed = TYPE_MAPPING.get(user_type, [])
+        self.allowed_types = TYPE_BITS[UNRESTRICTED]
+        for applicant_type in allowed:
+            self.allowed_types |= TYPE_BITS[applicant_type]
+        # Unknown organization types are not filtered rather than excluded from everything
+        self.check_type = bool(allowed)
+
+        preferences = profile.get("funding_preferences") or {}
+        self.min_amount = preferences.get("min_amount")
+        self.max_amount = preferences.get("max_amount")
+        if self.min_amount is None and self.max_amount is None and preferences.get("amount_ranges"):
+            self.min_amount, self.max_amount = _parse_amount_ranges(preferences["amount_ranges"])
+
+        attributes = profile.get("eligibility_attributes") or []
+        if isinstance(attributes, dict):
+            small_business = bool(attributes.get("is_small_business"))
+        else:
+            small_business = any(a in ("small_business", "is_small_business") for a in attributes)
+        self.is_small_business = small_business or user_type == "for_profit_small_business"
+
+
+def eligibility_mask(features, user_profile: Optional[Dict[str, Any]], alive: np.ndarray, now: Optional[datetime] = None):
+    """
+    AND the hard filters for one user into a boolean row mask.
+    Returns (mask, counts) where counts[reason] is how many otherwise-live grants each
+    filter eliminated (a grant is attributed to the first filter it fails).
+    """
+    user = UserFilter(user_profile)
+    now = now or datetime.now(timezone.utc)
+    today = np.datetime64(now.date(), "s")
+
+    checks = []
+    if user.check_type:
+        types = features.applicant_types
+        checks.append(("applicant_type_mismatch", (types == 0) | ((types & user.allowed_types) != 0)))
+    checks.append(("deadline_passed", ~(features.close_dates < today)))
+    if user.min_amount:
+        checks.append(("amount_too_low", ~(features.amount_ceiling < float(user.min_amount))))
+    if user.max_amount:
+        checks.append(("amount_too_high", ~(features.amount_floor > float(user.max_amount))))
+    if not user.is_small_business:
+        checks.append(("sbir_requires_small_business", ~features.is_sbir))
+
+    mask = alive.copy()
+    counts = {reason: 0 for reason in FILTER_REASONS}
+    for reason, passes in checks:
+        counts[reason] = int(np.count_nonzero(mask & ~passes))
+        mask &= passes
+    counts["eligible"] = int(np.count_nonzero(mask))
+    return mask, counts
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQLite file of (model, text hash) -> float32 embedding shared by the API, ingestion and scripts (unset disables it)
+EMBEDDING_CACHE_PATH = os.getenv("GRANT_EMBEDDING_CACHE_PATH")
+# Least recently used entries beyond this are evicted (~1.5 KB each at 384 dimensions)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("GRANT_EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Keys per SELECT (stays under SQLite's bound-parameter limit)
+LOOKUP_CHUNK = 500
+# Eviction trims to this fraction of max_entries so it does not run on every insert
+EVICT_TO = 0.9
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS embeddings ("
+    "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+    "PRIMARY KEY (model, text_hash)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)",
+)
+
+
+def _create_schema(conn: sqlite3.Connection):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def text_hash(text: str) -> str:
+    """Content address of an input text (the exact string the model sees)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed on-disk embedding cache: model name + sha256 of the input text -> float32 vector.
+
+    Every process on the host (API workers, ingestion, populate_neon_db.py, notebooks) can point at
+    the same file, so a text is embedded once per model. Size is bounded by evicting the least
+    recently used entries; export/import copy entries between files to start a fresh environment warm.
+    Returned vectors are read-only.
+    """
+
+    def __init__(self, path: str, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets readers in other processes proceed while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            _create_schema(conn)
+
+    def _connect(self, path: Optional[str] = None) -> sqlite3.Connection:
+        return sqlite3.connect(path or self.path, timeout=10)
+
+    def get_many(self, model_name: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector per text (None for misses), with one query per LOOKUP_CHUNK texts"""
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        try:
+            with self._connect() as conn:
+                unique = list(dict.fromkeys(hashes))
+                for i in range(0, len(unique), LOOKUP_CHUNK):
+                    chunk = unique[i:i + LOOKUP_CHUNK]
+                    rows = conn.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                        (model_name, *chunk),
+                    )
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype="<f4")
+                        vector.setflags(write=False)
+                        found[key] = vector
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model_name, key) for key in found],
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+        vectors = [found.get(key) for key in hashes]
+        with self._lock:
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model_name: str, texts: List[str], vectors: Iterable[np.ndarray]) -> List[np.ndarray]:
+        """Store freshly computed vectors; returns the read-only float32 copies"""
+        stored = []
+        for vector in vectors:
+            vector = np.array(vector, dtype=np.float32).ravel()
+            vector.setflags(write=False)
+            stored.append(vector)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                    [(model_name, text_hash(text), vector.astype("<f4").tobytes(), now) for text, vector in zip(texts, stored)],
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+        return stored
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Trim the least recently used entries once the file holds more than max_entries"""
+        count = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * EVICT_TO)
+        conn.execute(
+            "DELETE FROM embeddings WHERE (model, text_hash) IN "
+            "(SELECT model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        with self._lock:
+            self.evictions += excess
+        logger.info(f"Evicted {excess} least recently used embeddings from {self.path}")
+
+    def export(self, destination: str, model_name: Optional[str] = None) -> int:
+        """Copy entries (optionally of one model) into another cache file; returns the number copied"""
+        with self._connect(destination) as conn:
+            _create_schema(conn)
+            conn.execute("ATTACH DATABASE ? AS source", (self.path,))
+            where = "WHERE model = ?" if model_name else ""
+            cursor = conn.execute(
+                f"INSERT OR REPLACE INTO embeddings SELECT model, text_hash, vector, last_used FROM source.embeddings {where}",
+                (model_name,) if model_name else (),
+            )
+            copied = cursor.rowcount
+        logger.info(f"Exported {copied} embeddings to {destination}")
+        return copied
+
+    def import_from(self, source: str) -> int:
+        """Merge the entries of an exported cache file into this one; returns the number merged"""
+        with self._connect() as conn:
+            conn.execute("ATTACH DATABASE ? AS source", (source,))
+            cursor = conn.execute(
+                "INSERT INTO embeddings SELECT model, text_hash, vector, last_used FROM source.embeddings WHERE true "
+                "ON CONFLICT (model, text_hash) DO UPDATE SET last_used = max(last_used, excluded.last_used)"
+            )
+            imported = cursor.rowcount
+            self._evict(conn)
+        logger.info(f"Imported {imported} embeddings from {source}")
+        return imported
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            with self._connect() as conn:
+                entries = conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+def embed_with_cache(model: Any, model_name: str, texts: List[str], **embed_kwargs) -> List[np.ndarray]:
+    """
+    model.embed(texts) through the shared embedding cache: only texts not cached for model_name
+    (deduplicated) reach the model. Without a configured cache this is a plain model call.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        # fastembed.embed returns a generator over the batch
+        return list(model.embed(texts, **embed_kwargs))
+    vectors = cache.get_many(model_name, texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        encoded = dict(zip(missing, cache.put_many(model_name, missing, model.embed(missing, **embed_kwargs))))
+        vectors = [encoded[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+    return vectors
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide embedding cache, or None when GRANT_EMBEDDING_CACHE_PATH is unset or unusable"""
+    global _cache
+    if _cache is None and EMBEDDING_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning(f"Embedding cache {EMBEDDING_CACHE_PATH} unavailable, embedding without it: {e}")
+                    return None
+    return _cache
+
+
+def run_cache_command():
+    """Standalone cache maintenance: stats, export FILE [--model NAME], import FILE"""
+    parser = argparse.ArgumentParser(description="Manage the shared embedding cache (GRANT_EMBEDDING_CACHE_PATH)")
+    parser.add_argument("command", choices=["stats", "export", "import"])
+    parser.add_argument("file", nargs="?", help="Cache file to export to or import from")
+    parser.add_argument("--model", help="Export only this model's embeddings")
+    args = parser.parse_args()
+
+    cache = get_embedding_cache()
+    if cache is None:
+        print("GRANT_EMBEDDING_CACHE_PATH is not set")
+        return
+    if args.command != "stats" and not args.file:
+        parser.error(f"{args.command} needs a FILE")
+    if args.command == "export":
+        print(f"Exported {cache.export(args.file, args.model)} embeddings to {args.file}")
+    elif args.command == "import":
+        print(f"Imported {cache.import_from(args.file)} embeddings from {args.file}")
+    print(f"Embedding cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    run_cache_command()
@@ -0,0 +1,222 @@
+import logging
+import json
+import os
+import struct
+import time
+import uuid
+import numpy as np
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from database import get_db
+from models import Grant
+from ingestion.grant_features import GrantFeatures, FEATURE_COLUMNS
+from ingestion.vector_codec import decode_grant_embedding
+
+logger = logging.getLogger(__name__)
+
+# Directory holding published embedding stores; unset means build the index from the database
+STORE_DIR = os.getenv("GRANT_EMBEDDING_STORE_DIR")
+# Re-read rows this far behind the watermark so late-committing transactions are not missed
+REFRESH_OVERLAP_SECONDS = int(os.getenv("GRANT_INDEX_REFRESH_OVERLAP_SECONDS", "300"))
+
+# On-disk layout of a .f32 file:
+#   64-byte header: magic, format version, dtype code, dim, row count, build time
+#   row-major little-endian float32 matrix (rows already L2-normalized)
+# The .json sidecar holds the ids (row i belongs to ids[i]), the updated_at watermark
+# the store was built at and the stamps of rows inside the refresh overlap window. The .features.npz file holds the interned vocabularies, boost
+# bitsets and hard-filter arrays (see GrantFeatures). CURRENT names the published version.
+MAGIC = b"GMEMBED\0"
+FORMAT_VERSION = 1
+DTYPE_FLOAT32 = 1
+HEADER = struct.Struct("<8sHHIQd")
+HEADER_SIZE = 64
+CURRENT_FILE = "CURRENT"
+
+
+class EmbeddingStore:
+    """A published, read-only grant embedding matrix opened with np.memmap"""
+
+    def __init__(self, version: str, vectors: np.ndarray, ids: List[str], metadata: Dict[str, Any], features: Optional[GrantFeatures] = None):
+        self.version = version
+        self.features = features
+        self.vectors = vectors
+        self.ids = ids
+        watermark = metadata.get("watermark")
+        self.watermark = datetime.fromisoformat(watermark) if watermark else None
+        self.model_name = metadata.get("model_name")
+        # Stores written before the stamps were recorded have none; the first refresh re-applies the window
+        self.recent = {grant_id: datetime.fromisoformat(stamp) for grant_id, stamp in metadata.get("recent", {}).items()}
+
+    @staticmethod
+    def current_version(directory: str) -> Optional[str]:
+        """Return the published version named by CURRENT, or None if nothing is published"""
+        try:
+            with open(os.path.join(directory, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def open(cls, directory: str, version: Optional[str] = None) -> Optional["EmbeddingStore"]:
+        """Map the published (or given) store version; pages are shared through the OS page cache"""
+        version = version or cls.current_version(directory)
+        if not version:
+            return None
+
+        data_path = os.path.join(directory, f"grants-{version}.f32")
+        with open(data_path, "rb") as f:
+            magic, format_version, dtype_code, dim, count, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{data_path} is not a grant embedding store")
+        if format_version != FORMAT_VERSION or dtype_code != DTYPE_FLOAT32:
+            raise ValueError(f"Unsupported embedding store format {format_version}/{dtype_code} in {data_path}")
+        expected_size = HEADER_SIZE + count * dim * 4
+        if os.path.getsize(data_path) != expected_size:
+            raise ValueError(f"{data_path} is truncated: expected {expected_size} bytes")
+
+        with open(os.path.join(directory, f"grants-{version}.json")) as f:
+            metadata = json.load(f)
+        if len(metadata["ids"]) != count:
+            raise ValueError(f"Sidecar for {version} lists {len(metadata['ids'])} ids, matrix has {count} rows")
+
+        if count:
+            # Copy-on-write: in-place patches stay private to this worker, untouched pages stay shared
+            vectors = np.memmap(data_path, dtype="<f4", mode="c", offset=HEADER_SIZE, shape=(count, dim))
+        else:
+            vectors = np.zeros((0, dim), dtype=np.float32)
+        features = GrantFeatures.load(os.path.join(directory, f"grants-{version}.features.npz"))
+        if features is None or len(features) != count:
+            raise ValueError(f"Features for {version} are missing or from an older format; rebuild the store")
+        return cls(version, vectors, metadata["ids"], metadata, features)
+
+
+def build_embedding_store(db: Session, directory: str, chunk_size: int = 1000, keep_versions: int = 2) -> Dict[str, Any]:
+    """
+    Write every active, embedded grant to a new store version and publish it.
+    Rows are streamed to disk in chunks, then CURRENT is swapped with an atomic rename.
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    data_path = os.path.join(directory, f"grants-{version}.f32")
+    meta_path = os.path.join(directory, f"grants-{version}.json")
+
+    latest_update, latest_create = db.execute(
+        select(func.max(Grant.updated_at), func.max(Grant.created_at))
+    ).one()
+    stamps = [s for s in (latest_update, latest_create) if s is not None]
+    watermark = max(stamps) if stamps else None
+    since = watermark - timedelta(seconds=REFRESH_OVERLAP_SECONDS) if watermark else None
+
+    rows = db.execute(
+        select(Grant.id, Grant.embedding, Grant.embedding_data, Grant.embedding_model, Grant.updated_at, Grant.created_at, *FEATURE_COLUMNS)
+        .where(Grant.has_embedding, Grant.status == 'active')
+        .execution_options(yield_per=chunk_size)
+    )
+
+    ids = []
+    recent = {}
+    features = GrantFeatures()
+    model_name = None
+    dim = 0
+    with open(data_path + ".tmp", "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+        for chunk in rows.partitions(chunk_size):
+            block, block_rows = [], []
+            for row in chunk:
+                try:
+                    embedding = decode_grant_embedding(row.embedding, row.embedding_data)
+                    if embedding is None or embedding.ndim != 1 or embedding.size == 0 or (dim and embedding.size != dim):
+                        continue
+                except Exception as e:
+                    logger.warning(f"Error loading embedding for grant {row.id}: {e}")
+                    continue
+                dim = dim or embedding.size
+                model_name = model_name or row.embedding_model
+                block.append(embedding)
+                block_rows.append(row)
+                ids.append(row.id)
+                if since is not None and any(stamp is not None and stamp >= since for stamp in (row.updated_at, row.created_at)):
+                    recent[row.id] = (row.updated_at or row.created_at).isoformat()
+
+            if block:
+                features.append(block_rows)
+                matrix = np.vstack(block).astype("<f4")
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                np.divide(matrix, norms, out=matrix, where=norms > 0)
+                f.write(matrix.tobytes())
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_FLOAT32, dim, len(ids), time.time()))
+        f.flush()
+        os.fsync(f.fileno())
+
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "dim": dim,
+            "count": len(ids),
+            "model_name": model_name,
+            "watermark": watermark.isoformat() if watermark else None,
+            "ids": ids,
+            "recent": recent,
+        }, f)
+
+    features.save(os.path.join(directory, f"grants-{version}.features.npz"))
+
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(meta_path + ".tmp", meta_path)
+
+    # Publish: workers switch over the next time they see CURRENT change
+    current_tmp = os.path.join(directory, f"{CURRENT_FILE}.{version}.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(directory, CURRENT_FILE))
+
+    _remove_old_versions(directory, keep_versions)
+
+    stats = {
+        "version": version,
+        "grants": len(ids),
+        "dim": dim,
+        "bytes": os.path.getsize(data_path),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"Published embedding store: {stats}")
+    return stats
+
+
+def _remove_old_versions(directory: str, keep_versions: int):
+    """Delete all but the newest keep_versions stores (workers still mapping them keep their pages)"""
+    versions = sorted(
+        name[len("grants-"):-len(".f32")]
+        for name in os.listdir(directory)
+        if name.startswith("grants-") and name.endswith(".f32")
+    )
+    for version in versions[:-keep_versions]:
+        for suffix in (".f32", ".json", ".features.npz"):
+            try:
+                os.remove(os.path.join(directory, f"grants-{version}{suffix}"))
+            except OSError as e:
+                # Windows refuses to delete files that are still mapped; retry on the next build
+                logger.warning(f"Could not remove old embedding store {version}: {e}")
+
+
+def run_store_build():
+    """Standalone function to publish a new embedding store"""
+    if not STORE_DIR:
+        print("GRANT_EMBEDDING_STORE_DIR is not set")
+        return
+    db = next(get_db())
+    try:
+        stats = build_embedding_store(db, STORE_DIR)
+        print(f"Embedding store published: {stats}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_store_build()
@@ -1,111 +1,216 @@
+import hashlib
 import logging
-import gc
+import queue
+import threading
+import time
 from fastembed import TextEmbedding
+from sqlalchemy import or_, select, update
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Grant
+from ingestion.embedding_cache import embed_with_cache
+from ingestion.vector_codec import encode_vector
+from ingestion.model_registry import DEFAULT_MODEL_NAME, get_embedding_model
 import numpy as np
 import os
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Texts per model call (and per bulk UPDATE)
+EMBED_BATCH_SIZE = int(os.getenv("GRANT_EMBED_BATCH_SIZE", "256"))
+# Rows per keyset page read from the database
+EMBED_READ_CHUNK = int(os.getenv("GRANT_EMBED_READ_CHUNK", "2000"))
+# Batches buffered between pipeline stages (bounds peak memory)
+EMBED_QUEUE_BATCHES = int(os.getenv("GRANT_EMBED_QUEUE_BATCHES", "4"))
+
 class GrantEmbedder:
     """Generate embeddings for grant descriptions"""
 
-    def __init__(self, model_name: str = "BAAI/bge-small-en-v1.5"):
-        logger.info(f"Loading embedding model: {model_name} (FastEmbed mode)")
-        self.model = TextEmbedding(model_name=model_name)
-        gc.collect()
+    def __init__(self, model: Optional[TextEmbedding] = None, model_name: str = DEFAULT_MODEL_NAME):
+        # The process-wide shared instance unless one is passed in
+        self.model = model or get_embedding_model(model_name)
         self.model_name = model_name
 
     def generate_grant_embedding(self, grant: Grant) -> np.ndarray:
         """Generate embedding for a single grant"""
-        # Combine title and description for richer embedding
-        text = f"{grant.title} {grant.description}"
-
-        # Add focus areas if available
-        if grant.focus_areas:
-            focus_text = " ".join(grant.focus_areas)
-            text += f" {focus_text}"
-
-        # Generate embedding
-        embeddings = list(self.model.embed([text]))
+        embeddings = embed_with_cache(self.model, self.model_name, [grant_text(grant.title, grant.description, grant.focus_areas)])
         return np.array(embeddings[0])
 
-    def embed_all_grants(self, db: Session, batch_size: int = 10) -> Dict[str, int]:
-        """Generate embeddings for all grants without embeddings"""
-        logger.info("Starting grant embedding generation")
-
-        # Get grants that don't have embeddings yet
-        grants_to_embed = db.query(Grant).filter(
-            Grant.status == 'active',
-            Grant.embedding_data == None
-        ).all()
-
-        logger.info(f"Found {len(grants_to_embed)} grants to embed")
-
-        stats = {
-            'processed': 0,
-            'embedded': 0,
-            'skipped': 0,
-            'errors': 0
-        }
-
-        for i in range(0, len(grants_to_embed), batch_size):
-            batch = grants_to_embed[i:i + batch_size]
-            batch_texts = []
-
-            # Prepare batch texts
-            for grant in batch:
-                text = f"{grant.title} {grant.description}"
-                if grant.focus_areas:
-                    focus_text = " ".join(grant.focus_areas)
-                    text += f" {focus_text}"
-                batch_texts.append(text)
-
+    def embed_all_grants(self, db: Session, batch_size: int = EMBED_BATCH_SIZE, limit: int = 0, force: bool = False) -> Dict[str, Any]:
+        """
+        Embed every active grant whose stored embedding is missing or stale (at most limit when > 0)
+        as a pipeline: a reader thread streams keyset-paged rows into model-sized batches, the model
+        embeds them, and a writer thread stores each batch with one bulk UPDATE. The stages run
+        concurrently and hand off through bounded queues, so peak memory stays at a few batches
+        whatever the corpus size.
+
+        A row is stale when its fingerprint was cleared by ingestion (see flag_changed_text) or it
+        was embedded by another model. force=True re-checks every active grant; rows whose text
+        still matches their fingerprint are skipped rather than re-embedded.
+        """
+        logger.info(f"Starting grant embedding generation (batch size {batch_size}, force={force})")
+        start = time.perf_counter()
+        stats = {'processed': 0, 'embedded': 0, 'skipped': 0, 'errors': 0}
+        stats_lock = threading.Lock()
+        bind = db.get_bind()
+        # Backpressure: the reader stalls when the model falls behind, the model when the writer does
+        pending: "queue.Queue[Optional[List[Tuple[str, str, str]]]]" = queue.Queue(maxsize=EMBED_QUEUE_BATCHES)
+        embedded: "queue.Queue[Optional[Tuple[List[Tuple[str, str, str]], List[np.ndarray]]]]" = queue.Queue(maxsize=EMBED_QUEUE_BATCHES)
+
+        def read():
+            batch = []
             try:
-                # Generate embeddings for batch
-                # FastEmbed .embed() returns a generator of numpy arrays
-                embeddings = list(self.model.embed(batch_texts))
-
-                # Update grants with embeddings
-                for j, grant in enumerate(batch):
-                    try:
-                        # For now, we'll store embeddings as JSON in the database
-                        # In production, you'd want to use a proper vector database
-                        embedding_list = embeddings[j].tolist()
-
-                        # Store embedding in a way that can be retrieved later
-                        # Since SQLite doesn't support vector types, we'll use JSON
-                        # In a real implementation, you'd upsert to Qdrant here
-                        grant.embedding_data = embedding_list
-                        grant.embedding_model = self.model_name
-
-                        stats['embedded'] += 1
-                        logger.info(f"Embedded grant: {grant.title[:50]}...")
-
-                    except Exception as e:
-                        logger.error(f"Error embedding grant {grant.id}: {e}")
-                        stats['errors'] += 1
+                for row in _pending_rows(bind, self.model_name, force, limit):
+                    text = grant_text(row.title, row.description, row.focus_areas)
+                    fingerprint = grant_fingerprint(text, self.model_name)
+                    if row.embedded and row.embedding_fingerprint == fingerprint:
+                        with stats_lock:
+                            stats['skipped'] += 1
                         continue
-
-                # Commit batch
-                db.commit()
-                gc.collect() # Clean up after each batch
-                stats['processed'] += len(batch)
-                logger.info(f"Processed batch {i//batch_size + 1}, total processed: {stats['processed']}")
-
+                    batch.append((row.id, text, fingerprint))
+                    if len(batch) == batch_size:
+                        pending.put(batch)
+                        batch = []
+                if batch:
+                    pending.put(batch)
             except Exception as e:
-                logger.error(f"Error processing batch {i//batch_size + 1}: {e}")
-                stats['errors'] += len(batch)
-                continue
-
+                logger.error(f"Reading grants to embed failed: {e}")
+                with stats_lock:
+                    stats['errors'] += 1
+            finally:
+                pending.put(None)
+
+        def write():
+            while True:
+                item = embedded.get()
+                if item is None:
+                    return
+                batch, vectors = item
+                try:
+                    _write_batch(bind, batch, vectors, self.model_name)
+                    outcome = 'embedded'
+                except Exception as e:
+                    logger.error(f"Error storing {len(batch)} embeddings: {e}")
+                    outcome = 'errors'
+                with stats_lock:
+                    stats[outcome] += len(batch)
+                    stats['processed'] += len(batch)
+
+        reader = threading.Thread(target=read, name="embed-reader", daemon=True)
+        writer = threading.Thread(target=write, name="embed-writer", daemon=True)
+        reader.start()
+        writer.start()
+        try:
+            while True:
+                batch = pending.get()
+                if batch is None:
+                    break
+                try:
+                    # Texts already in the shared embedding cache skip the model
+                    embedded.put((batch, embed_with_cache(self.model, self.model_name, [text for _, text, _ in batch], batch_size=batch_size)))
+                except Exception as e:
+                    logger.error(f"Error embedding batch of {len(batch)} grants: {e}")
+                    with stats_lock:
+                        stats['errors'] += len(batch)
+                        stats['processed'] += len(batch)
+        finally:
+            embedded.put(None)
+            writer.join()
+        reader.join()
+
+        seconds = time.perf_counter() - start
+        stats['seconds'] = round(seconds, 2)
+        stats['docs_per_second'] = round(stats['embedded'] / seconds, 1) if seconds > 0 else None
         logger.info(f"Embedding generation completed: {stats}")
         return stats
 
+
+def grant_text(title: Optional[str], description: Optional[str], focus_areas: Any) -> str:
+    """The text a grant is embedded from: title, description and focus areas"""
+    # Combine title and description for richer embedding
+    text = f"{title} {description}"
+    if focus_areas:
+        text += " " + " ".join(focus_areas)
+    return text
+
+
+def grant_fingerprint(text: str, model_name: str) -> str:
+    """Identifies the model and grant text a stored grant embedding was computed from"""
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def flag_changed_text(grant: Grant) -> bool:
+    """
+    Called by ingestion after updating a grant in place. If the text the embedder consumes no
+    longer matches the stored fingerprint, the fingerprint is cleared so the next embedding run
+    picks the row up; the old vector keeps serving search until then. Returns True if flagged.
+    """
+    if not grant.has_embedding or grant.embedding_fingerprint is None:
+        return False  # Already queued for embedding
+    text = grant_text(grant.title, grant.description, grant.focus_areas)
+    if grant_fingerprint(text, grant.embedding_model or "") == grant.embedding_fingerprint:
+        return False
+    grant.embedding_fingerprint = None
+    return True
+
+
+def _pending_rows(bind, model_name: str, force: bool, limit: int) -> Iterator[Any]:
+    """
+    Stream the active grants to (re)consider for embedding. Rows are read in id-ordered keyset
+    pages, each in its own short transaction, so the reader never holds a cursor open across
+    the writer's commits.
+    """
+    last_id, remaining = None, limit if limit > 0 else None
+    with Session(bind) as session:
+        while remaining is None or remaining > 0:
+            page = EMBED_READ_CHUNK if remaining is None else min(EMBED_READ_CHUNK, remaining)
+            query = (
+                select(
+                    Grant.id, Grant.title, Grant.description, Grant.focus_areas, Grant.embedding_fingerprint,
+                    Grant.has_embedding.label("embedded"),
+                )
+                .where(Grant.status == 'active')
+                .order_by(Grant.id)
+                .limit(page)
+            )
+            if not force:
+                query = query.where(or_(
+                    ~Grant.has_embedding,
+                    Grant.embedding_fingerprint.is_(None),
+                    Grant.embedding_model.is_(None),
+                    Grant.embedding_model != model_name,
+                ))
+            if last_id is not None:
+                query = query.where(Grant.id > last_id)
+            rows = session.execute(query).all()
+            session.rollback()
+            if not rows:
+                break
+            yield from rows
+            last_id = rows[-1].id
+            if remaining is not None:
+                remaining -= len(rows)
+
+
+def _write_batch(bind, batch: List[Tuple[str, str, str]], vectors: List[np.ndarray], model_name: str):
+    """Store one batch of (id, text, fingerprint) embeddings with a single executemany UPDATE"""
+    # Bump updated_at so the search index delta refresh picks them up
+    now = datetime.now(timezone.utc)
+    with Session(bind) as session:
+        session.execute(update(Grant), [
+            {
+                "id": grant_id, "embedding": encode_vector(vector), "embedding_data": None, "embedding_fingerprint": fingerprint,
+                "embedding_model": model_name, "updated_at": now,
+            }
+            for (grant_id, _, fingerprint), vector in zip(batch, vectors)
+        ])
+        session.commit()
+
+
 def run_embedding_generation():
     """Standalone function to generate embeddings"""
     db = next(get_db())
@@ -0,0 +1,56 @@
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from database import get_db
+from models import Grant, IngestionRun
+
+logger = logging.getLogger(__name__)
+
+
+def close_expired_grants(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Flip every active grant whose close date is before today (UTC) to 'closed' in one UPDATE.
+    Uses the same cut-off as the index expiry and the deadline hard filter; bumps updated_at
+    so index refreshes and published embedding stores drop the rows too. Returns the count.
+    """
+    now = now or datetime.now(timezone.utc)
+    today = datetime(now.year, now.month, now.day)
+    result = db.execute(
+        update(Grant)
+        .where(Grant.status == 'active', Grant.close_date < today)
+        .values(status='closed', updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    if result.rowcount:
+        logger.info(f"Closed {result.rowcount} grants whose deadline passed before {today.date()}")
+    return result.rowcount
+
+
+def run_expiry_job():
+    """Standalone expiry run, recorded as an ingestion run with grants_closed set"""
+    db = next(get_db())
+    try:
+        run = IngestionRun(id=str(uuid.uuid4()), source='expiry', status='running')
+        db.add(run)
+        db.commit()
+        try:
+            run.grants_closed = close_expired_grants(db)
+            run.status = 'completed'
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Grant expiry failed: {e}")
+            run.status = 'failed'
+            run.error_message = str(e)
+        run.completed_at = datetime.now(timezone.utc)
+        db.commit()
+        print(f"Grant expiry {run.status}: {run.grants_closed or 0} grants closed")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_expiry_job()
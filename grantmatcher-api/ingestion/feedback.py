@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import MatchFeedback
+
+logger = logging.getLogger(__name__)
+
+# Grants at least this similar to a dismissed grant are pushed down
+DISMISS_SIMILARITY = float(os.getenv("GRANT_FEEDBACK_DISMISS_SIMILARITY", "0.85"))
+DISMISS_PENALTY = float(os.getenv("GRANT_FEEDBACK_DISMISS_PENALTY", "0.2"))
+# Grants at least this similar to a saved/applied grant are lifted
+POSITIVE_SIMILARITY = float(os.getenv("GRANT_FEEDBACK_POSITIVE_SIMILARITY", "0.85"))
+POSITIVE_BOOST = float(os.getenv("GRANT_FEEDBACK_POSITIVE_BOOST", "0.05"))
+# Users whose feedback ids are kept per process; other workers pick up new feedback after the TTL
+FEEDBACK_CACHE_SIZE = int(os.getenv("GRANT_FEEDBACK_CACHE_SIZE", "4096"))
+FEEDBACK_CACHE_TTL_SECONDS = int(os.getenv("GRANT_FEEDBACK_CACHE_TTL_SECONDS", "300"))
+
+POSITIVE_FEEDBACK = ("saved", "applied")
+
+
+def feedback_adjustments(vectors: np.ndarray, dismissed: np.ndarray, positive: np.ndarray) -> np.ndarray:
+    """
+    Score adjustment per row of vectors (L2-normalized): -DISMISS_PENALTY near any dismissed
+    grant, +POSITIVE_BOOST near any saved/applied one. One max-similarity pass per matrix.
+    """
+    adjustments = np.zeros(vectors.shape[0], dtype=np.float64)
+    if dismissed.shape[0]:
+        adjustments[(vectors @ dismissed.T).max(axis=1) >= DISMISS_SIMILARITY] -= DISMISS_PENALTY
+    if positive.shape[0]:
+        adjustments[(vectors @ positive.T).max(axis=1) >= POSITIVE_SIMILARITY] += POSITIVE_BOOST
+    return adjustments
+
+
+class FeedbackCache:
+    """
+    Per-user dismissed and positive (saved/applied) grant ids from match_feedback.
+
+    The ids go into the user's profile under "feedback"; the grant index turns them into
+    small vector matrices and a cached per-row adjustment (see GrantIndex.compute_boosts).
+    Entries are dropped when the user submits feedback and expire after ttl_seconds so
+    writes handled by other workers are picked up.
+    """
+
+    def __init__(self, max_size: int = FEEDBACK_CACHE_SIZE, ttl_seconds: int = FEEDBACK_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Dict[str, List[str]]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, user_id: str) -> Optional[Dict[str, List[str]]]:
+        """{"dismissed": [...], "positive": [...]} for one user, or None without feedback"""
+        return self.get_many(db, [user_id])[user_id]
+
+    def get_many(self, db: Session, user_ids: List[str]) -> Dict[str, Optional[Dict[str, List[str]]]]:
+        """Feedback for many users, loading every miss with one query"""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = entry[1]
+                    self.hits += 1
+                else:
+                    missing.append(user_id)
+                    self.misses += 1
+        if not missing:
+            return found
+
+        loaded: Dict[str, Dict[str, set]] = {user_id: {"dismissed": set(), "positive": set()} for user_id in missing}
+        rows = db.execute(
+            select(MatchFeedback.user_id, MatchFeedback.grant_id, MatchFeedback.feedback_type)
+            .where(MatchFeedback.user_id.in_(missing))
+        )
+        for user_id, grant_id, feedback_type in rows:
+            kind = "positive" if feedback_type in POSITIVE_FEEDBACK else "dismissed" if feedback_type == "dismissed" else None
+            if kind:
+                loaded[user_id][kind].add(grant_id)
+
+        with self._lock:
+            for user_id, kinds in loaded.items():
+                feedback = {kind: sorted(ids) for kind, ids in kinds.items()} if any(kinds.values()) else None
+                found[user_id] = feedback
+                if self.max_size > 0:
+                    self._entries[user_id] = (now, feedback)
+                    self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return found
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+_cache: Optional[FeedbackCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_feedback_cache() -> FeedbackCache:
+    """Process-wide per-user feedback cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FeedbackCache()
+    return _cache
@@ -0,0 +1,281 @@
+import logging
+import json
+import os
+import numpy as np
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from models import Grant
+from ingestion.quantization import popcount
+from ingestion.eligibility import applicant_type_mask, is_sbir_program
+
+logger = logging.getLogger(__name__)
+
+# Boost weights used by the hybrid scorer (kept identical to the original row-by-row loop)
+ELIGIBILITY_BOOST = 0.1
+ELIGIBILITY_FALLBACK_BOOST = 0.05
+FOCUS_BOOST_PER_MATCH = 0.05
+FOCUS_BOOST_CAP = 0.15
+
+WORD_BITS = 64
+FEATURES_VERSION = 2
+
+# Grant columns every index/store row must carry for boosts and hard filters
+FEATURE_COLUMNS = (
+    Grant.eligible_applicant_types,
+    Grant.focus_areas,
+    Grant.agency,
+    Grant.close_date,
+    Grant.amount_floor,
+    Grant.amount_ceiling,
+    Grant.program_name,
+)
+
+
+class Vocabulary:
+    """Interns terms (applicant types, focus areas, agencies) into dense integer ids"""
+
+    def __init__(self, terms: Optional[List[Any]] = None):
+        self.terms: List[Any] = []
+        self.ids: Dict[Any, int] = {}
+        for term in terms or []:
+            self.intern(term)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def intern(self, term: Any) -> int:
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = len(self.terms)
+            self.ids[term] = term_id
+            self.terms.append(term)
+        return term_id
+
+    def get(self, term: Any) -> Optional[int]:
+        try:
+            return self.ids.get(term)
+        except TypeError:
+            return None
+
+
+def _to_datetime64(value: Optional[datetime]) -> np.datetime64:
+    if value is None:
+        return np.datetime64("NaT", "s")
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, "s")
+
+
+def _amount(value: Optional[int]) -> float:
+    # Missing or zero amounts never trigger the amount filters (NaN compares False)
+    return float(value) if value else np.nan
+
+
+def _words(n_terms: int) -> int:
+    return max(1, (n_terms + WORD_BITS - 1) // WORD_BITS)
+
+
+def parse_eligibility(eligibility: Any) -> Tuple[List[Any], Optional[Tuple[str, float]]]:
+    """
+    Split a grant's eligible_applicant_types into interned terms, or a substring fallback.
+    Mirrors the original scorer: lists match by membership, a JSON string matches by
+    substring (+0.1), and unparsable text matches by substring on str() (+0.05).
+    """
+    if not eligibility:
+        return [], None
+    try:
+        elig_list = eligibility if isinstance(eligibility, list) else json.loads(eligibility)
+    except Exception:
+        return [], (str(eligibility), ELIGIBILITY_FALLBACK_BOOST)
+    if isinstance(elig_list, str):
+        return [], (elig_list, ELIGIBILITY_BOOST)
+    try:
+        return list(set(elig_list)), None
+    except TypeError:
+        return [], None
+
+
+def parse_focus_areas(focus_areas: Any) -> List[Any]:
+    if not focus_areas:
+        return []
+    try:
+        return list(set(focus_areas if isinstance(focus_areas, list) else json.loads(focus_areas)))
+    except Exception:
+        return []
+
+
+class GrantFeatures:
+    """
+    Boost and filter metadata for the grant index as packed, row-aligned arrays.
+
+    Applicant types and focus areas are interned into vocabularies; row i of
+    eligibility_bits / focus_bits has bit j set when grant i carries term j. Agencies are
+    interned into one int32 code per row. Boosts for every grant are then a handful of
+    NumPy bit operations instead of per-row json.loads calls.
+
+    The hard eligibility filters use applicant_types (canonical type bitmask, see
+    ingestion.eligibility), close_dates, amount_floor/amount_ceiling and is_sbir.
+    """
+
+    def __init__(self):
+        self.eligibility_vocab = Vocabulary()
+        self.focus_vocab = Vocabulary()
+        self.agency_vocab = Vocabulary()
+        self.eligibility_bits = np.zeros((0, 1), dtype=np.uint64)
+        self.focus_bits = np.zeros((0, 1), dtype=np.uint64)
+        self.agency_codes = np.zeros(0, dtype=np.int32)
+        # row -> (raw text, boost) for eligibility values that only match by substring
+        self.eligibility_fallback: Dict[int, Tuple[str, float]] = {}
+        self.applicant_types = np.zeros(0, dtype=np.uint16)
+        self.close_dates = np.zeros(0, dtype="datetime64[s]")
+        self.amount_floor = np.zeros(0, dtype=np.float64)
+        self.amount_ceiling = np.zeros(0, dtype=np.float64)
+        self.is_sbir = np.zeros(0, dtype=bool)
+
+    # Row-aligned arrays, in the order they are encoded, saved and sliced
+    ARRAYS = (
+        "eligibility_bits", "focus_bits", "agency_codes",
+        "applicant_types", "close_dates", "amount_floor", "amount_ceiling", "is_sbir",
+    )
+
+    def __len__(self) -> int:
+        return self.agency_codes.shape[0]
+
+    def _encode(self, rows) -> Tuple[Dict[str, np.ndarray], Dict[int, Tuple[str, float]]]:
+        """Encode rows carrying FEATURE_COLUMNS into arrays keyed like ARRAYS"""
+        elig_terms, fallbacks, focus_terms = [], {}, []
+        for i, row in enumerate(rows):
+            terms, fallback = parse_eligibility(row.eligible_applicant_types)
+            elig_terms.append([self.eligibility_vocab.intern(t) for t in terms])
+            if fallback is not None:
+                fallbacks[i] = fallback
+            focus_terms.append([self.focus_vocab.intern(t) for t in parse_focus_areas(row.focus_areas)])
+
+        self._widen()
+        arrays = {
+            "eligibility_bits": self._pack(elig_terms, self.eligibility_bits.shape[1]),
+            "focus_bits": self._pack(focus_terms, self.focus_bits.shape[1]),
+            "agency_codes": np.asarray([self.agency_vocab.intern(r.agency) if r.agency else -1 for r in rows], dtype=np.int32),
+            "applicant_types": np.asarray([applicant_type_mask(r.eligible_applicant_types) for r in rows], dtype=np.uint16),
+            "close_dates": np.asarray([_to_datetime64(r.close_date) for r in rows], dtype="datetime64[s]"),
+            "amount_floor": np.asarray([_amount(r.amount_floor) for r in rows], dtype=np.float64),
+            "amount_ceiling": np.asarray([_amount(r.amount_ceiling) for r in rows], dtype=np.float64),
+            "is_sbir": np.asarray([is_sbir_program(r.program_name) for r in rows], dtype=bool),
+        }
+        return arrays, fallbacks
+
+    @staticmethod
+    def _pack(rows_terms: List[List[int]], words: int) -> np.ndarray:
+        bits = np.zeros((len(rows_terms), words), dtype=np.uint64)
+        for row, terms in enumerate(rows_terms):
+            for term_id in terms:
+                bits[row, term_id // WORD_BITS] |= np.uint64(1) << np.uint64(term_id % WORD_BITS)
+        return bits
+
+    def _widen(self):
+        """Add bitset words when a vocabulary has outgrown the current width"""
+        for attr, vocab in (("eligibility_bits", self.eligibility_vocab), ("focus_bits", self.focus_vocab)):
+            bits = getattr(self, attr)
+            extra = _words(len(vocab)) - bits.shape[1]
+            if extra > 0:
+                setattr(self, attr, np.pad(bits, ((0, 0), (0, extra))))
+
+    def append(self, rows):
+        base = len(self)
+        arrays, fallbacks = self._encode(rows)
+        for name in self.ARRAYS:
+            setattr(self, name, np.concatenate([getattr(self, name), arrays[name]]))
+        for row, fallback in fallbacks.items():
+            self.eligibility_fallback[base + row] = fallback
+
+    def set_row(self, position: int, row):
+        arrays, fallbacks = self._encode([row])
+        for name in self.ARRAYS:
+            getattr(self, name)[position] = arrays[name][0]
+        self.eligibility_fallback.pop(position, None)
+        if 0 in fallbacks:
+            self.eligibility_fallback[position] = fallbacks[0]
+
+    def take(self, positions: np.ndarray):
+        """Keep only the given rows (in order), e.g. when the index is compacted"""
+        remap = {int(old): new for new, old in enumerate(positions)}
+        for name in self.ARRAYS:
+            setattr(self, name, getattr(self, name)[positions])
+        self.eligibility_fallback = {
+            remap[row]: fallback for row, fallback in self.eligibility_fallback.items() if row in remap
+        }
+
+    def has_term(self, bits: np.ndarray, term_id: int) -> np.ndarray:
+        """Boolean column: which rows carry the given interned term"""
+        word = bits[:, term_id // WORD_BITS]
+        return ((word >> np.uint64(term_id % WORD_BITS)) & np.uint64(1)).astype(bool)
+
+    def mask_for(self, bits: np.ndarray, vocab: Vocabulary, terms) -> np.ndarray:
+        """Packed query mask with a bit set for each known term"""
+        mask = np.zeros(bits.shape[1], dtype=np.uint64)
+        for term in terms:
+            term_id = vocab.get(term)
+            if term_id is not None:
+                mask[term_id // WORD_BITS] |= np.uint64(1) << np.uint64(term_id % WORD_BITS)
+        return mask
+
+    def compute_boosts(self, user_profile: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Eligibility (+0.1) and focus-area (+0.05 per overlap, max 0.15) boosts for every grant"""
+        boosts = np.zeros(len(self), dtype=np.float64)
+        if not user_profile:
+            return boosts
+
+        user_type = user_profile.get('organization_type')
+        if user_type:
+            term_id = self.eligibility_vocab.get(user_type)
+            if term_id is not None:
+                boosts[self.has_term(self.eligibility_bits, term_id)] += ELIGIBILITY_BOOST
+            for row, (raw, boost) in self.eligibility_fallback.items():
+                if user_type in raw:
+                    boosts[row] += boost
+
+        user_focus = set(user_profile.get('focus_areas') or [])
+        if user_focus:
+            mask = self.mask_for(self.focus_bits, self.focus_vocab, user_focus)
+            if mask.any():
+                overlap = popcount((self.focus_bits & mask).view(np.uint8)).reshape(len(self), -1).sum(axis=1)
+                boosts += np.minimum(overlap * FOCUS_BOOST_PER_MATCH, FOCUS_BOOST_CAP)
+
+        return boosts
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    def save(self, path: str):
+        """Write vocabularies and bitsets next to an embedding store version"""
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(
+                f,
+                version=np.int32(FEATURES_VERSION),
+                vocabularies=np.asarray(json.dumps({
+                    "eligibility": self.eligibility_vocab.terms,
+                    "focus": self.focus_vocab.terms,
+                    "agency": self.agency_vocab.terms,
+                })),
+                fallback=np.asarray(json.dumps([[row, raw, boost] for row, (raw, boost) in self.eligibility_fallback.items()])),
+                **{name: getattr(self, name) for name in self.ARRAYS},
+            )
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["GrantFeatures"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != FEATURES_VERSION:
+                return None
+            features = cls()
+            vocabularies = json.loads(str(data["vocabularies"]))
+            features.eligibility_vocab = Vocabulary(vocabularies["eligibility"])
+            features.focus_vocab = Vocabulary(vocabularies["focus"])
+            features.agency_vocab = Vocabulary(vocabularies["agency"])
+            features.eligibility_fallback = {row: (raw, boost) for row, raw, boost in json.loads(str(data["fallback"]))}
+            for name in cls.ARRAYS:
+                setattr(features, name, data[name])
+        return features
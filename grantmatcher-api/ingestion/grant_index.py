@@ -0,0 +1,893 @@
+import logging
+import heapq
+import itertools
+import threading
+import time
+import json
+import os
+import tempfile
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session
+from models import Grant
+from ingestion.embedding_store import EmbeddingStore, STORE_DIR, REFRESH_OVERLAP_SECONDS
+from ingestion.ann_index import IVFIndex, ANN_MIN_GRANTS, ANN_NLIST, ANN_NPROBE, ANN_RECALL_K, ANN_INDEX_PATH, ANN_RECALL_SAMPLES, ANN_TRAIN_SAMPLE, recall_at_k
+from ingestion.quantization import QuantizedVectors, QUANTIZATION_MODE, RESCORE_K, quantization_report, measure_quantized_recall
+from ingestion.grant_features import GrantFeatures, FEATURE_COLUMNS
+from ingestion.eligibility import HARD_FILTERS_ENABLED, eligibility_mask
+from ingestion.pgvector_search import pgvector_enabled
+from ingestion.feedback import feedback_adjustments
+from ingestion.vector_codec import decode_grant_embedding
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) a search triggers a delta refresh against the database
+REFRESH_INTERVAL_SECONDS = int(os.getenv("GRANT_INDEX_REFRESH_SECONDS", "60"))
+# Compact the matrix once this fraction of rows are tombstones
+COMPACT_RATIO = float(os.getenv("GRANT_INDEX_COMPACT_RATIO", "0.25"))
+
+INDEX_COLUMNS = (Grant.id, Grant.embedding, Grant.embedding_data) + FEATURE_COLUMNS
+
+# Scratch memory (MB) for one block of a batched search's similarity matrix
+BATCH_BLOCK_MB = int(os.getenv("GRANT_BATCH_BLOCK_MB", "64"))
+
+# Below this eligible fraction, exact scoring gathers the eligible rows instead of scoring all rows
+GATHER_FRACTION = 0.5
+
+# Exact scoring splits the matrix into this many row shards, scored in parallel (1 disables)
+SEARCH_SHARDS = int(os.getenv("GRANT_SEARCH_SHARDS", "1"))
+# Threads scoring shards (0 = one per CPU); NumPy releases the GIL inside the matrix products
+SEARCH_WORKERS = int(os.getenv("GRANT_SEARCH_WORKERS", "0"))
+# Smaller indexes are scored in one piece; the thread hand-off costs more than it saves
+SHARD_MIN_GRANTS = int(os.getenv("GRANT_SHARD_MIN_GRANTS", "50000"))
+
+# Distinct feedback states whose per-row adjustments are kept (per corpus version)
+FEEDBACK_ADJUSTMENTS_CACHE_SIZE = 1024
+
+# Where a quantized index built from the database spills its float32 rows (default: system temp dir)
+SPILL_DIR = os.getenv("GRANT_QUANTIZATION_SPILL_DIR") or None
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in place; zero vectors stay zero so they score 0.0"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def _spill_rows(blocks, rows: int, dim: int) -> np.ndarray:
+    """Copy row blocks into a memmap over an unlinked temporary file (pages live in the page cache, not the heap)"""
+    if rows == 0:
+        return np.zeros((0, dim), dtype=np.float32)
+    with tempfile.TemporaryFile(dir=SPILL_DIR) as f:
+        spilled = np.memmap(f, dtype=np.float32, mode="w+", shape=(rows, dim))
+    start = 0
+    for block in blocks:
+        spilled[start:start + block.shape[0]] = block
+        start += block.shape[0]
+    return spilled
+
+
+def _today() -> datetime:
+    """Start of the current UTC day (naive, like the close_date column): the expiry cut-off"""
+    return datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo is not None else value
+
+
+# Source of corpus versions; every index change takes the next value
+_generations = itertools.count(1)
+
+
+class GrantIndex:
+    """
+    In-memory index of active grant embeddings.
+
+    All embeddings live in one contiguous, L2-normalized float32 matrix so a query is a
+    single matrix-vector product. Grant ids and boost metadata (interned bitsets, see
+    GrantFeatures) are kept in parallel arrays (row i of the matrix belongs to ids[i]).
+
+    The index is kept current with delta refreshes keyed on Grant.updated_at/created_at:
+    changed rows are patched in place, new rows are appended, rows that left the active
+    set are tombstoned, and the matrix is compacted once tombstones pile up.
+
+    When loaded from a published EmbeddingStore the base matrix is a shared memmap;
+    appended rows then go to a small private tail so the shared pages are never copied.
+
+    Large corpora attach an IVFIndex: each row carries a cell id, and a search only scores
+    the rows in the query's closest cells before reranking the best ANN_RECALL_K.
+
+    With GRANT_QUANTIZATION=int8|binary, exact scoring first ranks every row on the
+    compact codes and only re-scores the best RESCORE_K against the float32 rows. Those
+    rows are then kept out of process memory: a matrix built from the database is spilled
+    to a temporary file mapping (appends go to the tail, compaction re-spills).
+
+    Hard eligibility filters (applicant type, deadline, amount, SBIR) are applied as a
+    row mask before any scoring, so ineligible grants never take a top-k slot.
+
+    With GRANT_SEARCH_SHARDS > 1, exact scoring of a large index splits the rows into
+    contiguous shards scored on a thread pool; each shard returns its own top_k and the
+    sorted partial lists are heap-merged, giving the same ranking as one full pass.
+
+    Grants retire themselves once their close date passes: every row's close date sits on
+    an expiry heap, and each refresh pops the grants whose deadline is before today (UTC)
+    and tombstones them, so compaction shrinks the matrix as the corpus ages instead of
+    scoring dead opportunities forever.
+
+    A profile's "feedback" (dismissed and saved/applied grant ids, see ingestion.feedback)
+    becomes part of its boosts: one max-similarity pass of the matrix against those grants'
+    rows, cached as a sparse adjustment until the corpus changes.
+    """
+
+    def __init__(self, dim: int = 0):
+        self.ids: List[str] = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.tail = np.zeros((0, dim), dtype=np.float32)
+        self.store_version: Optional[str] = None
+        self.alive = np.zeros(0, dtype=bool)
+        self.features = GrantFeatures()
+        self.positions: Dict[str, int] = {}
+        self.ann: Optional[IVFIndex] = None
+        self.ann_recall: Optional[float] = None
+        self.cells = np.zeros(0, dtype=np.int32)
+        self.quantized: Optional[QuantizedVectors] = None
+        self.quantization_recall: Optional[float] = None
+        self.spilled = False
+        self.tombstones = 0
+        self.watermark: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self.generation = next(_generations)
+        self._recent: Dict[str, Optional[datetime]] = {}
+        self._feedback: "OrderedDict[Tuple[Tuple[str, ...], Tuple[str, ...]], Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._feedback_generation = self.generation
+        # (close date as epoch seconds, grant id); stale entries are skipped when popped
+        self._expiry: List[Tuple[int, str]] = []
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    @classmethod
+    def build(cls, db: Session) -> "GrantIndex":
+        """Load every active, embedded grant from the database into a new index"""
+        start = time.perf_counter()
+        index = cls()
+        # Take the watermark before reading so rows committed mid-load are re-read next refresh
+        watermark = cls._current_watermark(db)
+        today = _today()
+        rows = db.execute(
+            select(*INDEX_COLUMNS, Grant.updated_at, Grant.created_at)
+            .where(Grant.has_embedding, Grant.status == 'active')
+            .where(or_(Grant.close_date.is_(None), Grant.close_date >= today))
+        ).fetchall()
+
+        index._apply(upserts=rows, removals=[])
+        index.watermark = watermark
+        if watermark is not None:
+            # Seed the refresh stamps so the first refresh does not re-apply the overlap window
+            since = watermark - timedelta(seconds=REFRESH_OVERLAP_SECONDS)
+            index._recent = {
+                row.id: row.updated_at or row.created_at for row in rows
+                if any(stamp is not None and stamp >= since for stamp in (row.updated_at, row.created_at))
+            }
+        index.refreshed_at = time.time()
+        logger.info(f"Built grant index with {len(index)} grants in {time.perf_counter() - start:.2f}s")
+        return index
+
+    @property
+    def corpus_version(self) -> int:
+        """Changes whenever the indexed grants change (process-wide unique, also across reloads)"""
+        return self.generation
+
+    @property
+    def snapshot_version(self) -> str:
+        """
+        Database watermark and size of the loaded rows; unlike corpus_version it means the same
+        in every worker process, so it can tag responses (HTTP ETags) built from this index
+        """
+        return f"{self.watermark.isoformat() if self.watermark else ''}/{len(self)}"
+
+    @property
+    def shared(self) -> bool:
+        """True when the base matrix is mapped from an embedding store file"""
+        return isinstance(self.vectors, np.memmap) and not self.spilled
+
+    @classmethod
+    def from_store(cls, store: EmbeddingStore) -> "GrantIndex":
+        """Wrap a memory-mapped embedding store; call refresh() afterwards to catch up with the database"""
+        index = cls(store.vectors.shape[1])
+        index.vectors = store.vectors
+        index.tail = np.zeros((0, index.dim), dtype=np.float32)
+        index.ids = list(store.ids)
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        index.cells = np.zeros(len(index.ids), dtype=np.int32)
+        index.features = store.features
+        index.positions = {grant_id: i for i, grant_id in enumerate(index.ids)}
+        index.watermark = store.watermark
+        index.store_version = store.version
+        # Rows the store already holds are not re-applied (and copied out of the shared pages) on the first refresh
+        index._recent = dict(store.recent)
+        index._schedule(index.ids)
+        logger.info(f"Mapped embedding store {store.version} with {len(index)} grants")
+        return index
+
+    @staticmethod
+    def _current_watermark(db: Session) -> Optional[datetime]:
+        latest_update, latest_create = db.execute(
+            select(func.max(Grant.updated_at), func.max(Grant.created_at))
+        ).one()
+        stamps = [s for s in (latest_update, latest_create) if s is not None]
+        return max(stamps) if stamps else None
+
+    def refresh(self, db: Session) -> Dict[str, int]:
+        """Pull only the grants that changed since the watermark and patch them into the index"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            watermark = self._current_watermark(db)
+            query = select(*INDEX_COLUMNS, Grant.status, Grant.updated_at, Grant.created_at)
+            if self.watermark is not None:
+                since = self.watermark - timedelta(seconds=REFRESH_OVERLAP_SECONDS)
+                query = query.where(or_(Grant.updated_at >= since, Grant.created_at >= since))
+            rows = db.execute(query).fetchall()
+
+            upserts, removals = [], []
+            today = _today()
+            # Rows re-read only because of the overlap window are skipped, so an unchanged
+            # corpus keeps its corpus_version (and cached results) across refreshes
+            recent = {row.id: row.updated_at or row.created_at for row in rows}
+            for row in rows:
+                if self._recent.get(row.id, False) == recent[row.id]:
+                    continue
+                # Grants already past their deadline are never (re-)added
+                if row.status == 'active' and (row.embedding is not None or row.embedding_data is not None) and not (row.close_date and _naive_utc(row.close_date) < today):
+                    upserts.append(row)
+                else:
+                    removals.append(row.id)
+
+            stats = self._apply(upserts, removals)
+            stats['expired'] = self.expire()
+            self._recent = recent
+            self.watermark = watermark or self.watermark
+            self.refreshed_at = time.time()
+
+        if stats['upserted'] or stats['removed'] or stats['expired']:
+            logger.info(f"Grant index refresh in {time.perf_counter() - start:.2f}s: {stats}")
+        return stats
+
+    def _apply(self, upserts, removals: List[str]) -> Dict[str, int]:
+        """Patch changed rows in place, append new ones and tombstone removals"""
+        stats = {'upserted': 0, 'appended': 0, 'removed': 0, 'compacted': 0}
+        new_ids, new_vectors, new_rows, patched = [], [], [], []
+
+        with self._lock:
+            for row in upserts:
+                grant_id = row.id
+                try:
+                    embedding = decode_grant_embedding(row.embedding, row.embedding_data)
+                    if embedding is None or embedding.ndim != 1 or embedding.size == 0:
+                        removals.append(grant_id)
+                        continue
+                    dim = self.dim or (new_vectors[0].size if new_vectors else embedding.size)
+                    if embedding.size != dim:
+                        logger.warning(f"Skipping grant {grant_id}: embedding has {embedding.size} dims, expected {dim}")
+                        continue
+                except Exception as e:
+                    logger.warning(f"Error loading embedding for grant {grant_id}: {e}")
+                    continue
+
+                position = self.positions.get(grant_id)
+                if position is not None:
+                    vector = _normalize_rows(embedding[None, :].astype(np.float32))[0]  # Decoded vectors are read-only views
+                    base_rows = self.vectors.shape[0]
+                    if position < base_rows:
+                        self.vectors[position] = vector
+                    else:
+                        self.tail[position - base_rows] = vector
+                    if self.ann is not None:
+                        self.cells[position] = self.ann.assign(vector[None, :])[0]
+                    if self.quantized is not None:
+                        self.quantized.set_rows([position], vector[None, :])
+                    self.features.set_row(position, row)
+                    patched.append(grant_id)
+                    stats['upserted'] += 1
+                else:
+                    new_ids.append(grant_id)
+                    new_vectors.append(embedding)
+                    new_rows.append(row)
+
+            for grant_id in removals:
+                position = self.positions.pop(grant_id, None)
+                if position is not None:
+                    self.alive[position] = False
+                    self.tombstones += 1
+                    stats['removed'] += 1
+
+            if new_ids:
+                # De-duplicate ids that appear twice in one batch (keep the last version)
+                latest = {grant_id: i for i, grant_id in enumerate(new_ids)}
+                keep = sorted(latest.values())
+                block = _normalize_rows(np.vstack([new_vectors[i] for i in keep]))
+                base = len(self.ids)
+                if self.shared or self.spilled:
+                    self.tail = np.vstack([self.tail, block])
+                else:
+                    self.vectors = np.vstack([self.vectors, block]) if self.ids else block
+                self.alive = np.concatenate([self.alive, np.ones(len(keep), dtype=bool)])
+                new_cells = self.ann.assign(block) if self.ann is not None else np.zeros(len(keep), dtype=np.int32)
+                self.cells = np.concatenate([self.cells, new_cells])
+                if self.quantized is not None:
+                    self.quantized.append(block)
+                for offset, i in enumerate(keep):
+                    self.ids.append(new_ids[i])
+                    self.positions[new_ids[i]] = base + offset
+                self.features.append([new_rows[i] for i in keep])
+                patched.extend(new_ids[i] for i in keep)
+                stats['appended'] = len(keep)
+                stats['upserted'] += len(keep)
+
+            # Rows removed in this batch are skipped by _schedule
+            self._schedule(patched)
+
+            # Shared stores are compacted by publishing a new version instead; a spilled
+            # matrix is also re-spilled once its private tail grows
+            limit = COMPACT_RATIO * len(self.ids)
+            if self.ids and not self.shared and (self.tombstones > limit or self.tail.shape[0] > limit):
+                stats['compacted'] = self._compact()
+
+            if stats['upserted'] or stats['removed']:
+                self.generation = next(_generations)
+
+        return stats
+
+    def _schedule(self, grant_ids: List[str]):
+        """Queue the close dates of (new or changed) grants on the expiry heap"""
+        grant_ids = [grant_id for grant_id in grant_ids if grant_id in self.positions]
+        if not grant_ids:
+            return
+        closes = self.features.close_dates[np.asarray([self.positions[g] for g in grant_ids], dtype=np.int64)]
+        dated = np.flatnonzero(~np.isnat(closes))
+        entries = list(zip(closes[dated].astype(np.int64).tolist(), (grant_ids[i] for i in dated)))
+        if len(entries) > len(self._expiry) // 8:
+            self._expiry.extend(entries)
+            heapq.heapify(self._expiry)
+        else:
+            for entry in entries:
+                heapq.heappush(self._expiry, entry)
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Tombstone every grant whose close date is before today (UTC); returns how many"""
+        today = int(np.datetime64((now or datetime.now(timezone.utc)).date(), "s").astype(np.int64))
+        with self._lock:
+            due = []
+            while self._expiry and self._expiry[0][0] < today:
+                stamp, grant_id = heapq.heappop(self._expiry)
+                position = self.positions.get(grant_id)
+                # Skip entries for removed grants or close dates that have since changed
+                if position is not None and int(self.features.close_dates[position].astype(np.int64)) == stamp:
+                    due.append(grant_id)
+            if not due:
+                return 0
+            self._apply(upserts=[], removals=due)
+        logger.info(f"Retired {len(due)} grants whose deadline has passed")
+        return len(due)
+
+    def _compact(self) -> int:
+        """Drop tombstoned rows so the matrix is contiguous again"""
+        keep = np.flatnonzero(self.alive)
+        dropped = len(self.ids) - keep.size
+        if self.spilled:
+            blocks = (self._gather(keep[start:start + 8192]) for start in range(0, keep.size, 8192))
+            self.vectors = _spill_rows(blocks, keep.size, self.dim)
+            self.tail = np.zeros((0, self.dim), dtype=np.float32)
+        else:
+            self.vectors = np.ascontiguousarray(self.vectors[keep])
+        self.alive = np.ones(keep.size, dtype=bool)
+        self.cells = self.cells[keep]
+        if self.quantized is not None:
+            self.quantized.take(keep)
+        self.ids = [self.ids[i] for i in keep]
+        self.features.take(keep)
+        self.positions = {grant_id: i for i, grant_id in enumerate(self.ids)}
+        self.tombstones = 0
+        return dropped
+
+    def compute_boosts(self, user_profile: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Eligibility (+0.1), focus-area (+0.05 per overlap, max 0.15) and feedback boosts for every row"""
+        boosts = self.features.compute_boosts(user_profile)
+        feedback = (user_profile or {}).get("feedback")
+        if feedback:
+            positions, adjustments = self._feedback_adjustments(feedback)
+            boosts[positions] += adjustments
+        return boosts
+
+    def _feedback_adjustments(self, feedback: Dict[str, List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows affected by a user's feedback and their score adjustments (sparse, cached)"""
+        key = (tuple(feedback.get("dismissed") or ()), tuple(feedback.get("positive") or ()))
+        with self._lock:
+            if self._feedback_generation != self.generation:
+                self._feedback.clear()
+                self._feedback_generation = self.generation
+            cached = self._feedback.get(key)
+            if cached is not None:
+                self._feedback.move_to_end(key)
+                return cached
+
+            dismissed, positive = (
+                self._gather(np.asarray([self.positions[g] for g in ids if g in self.positions], dtype=np.int64))
+                for ids in key
+            )
+            adjustments = feedback_adjustments(self.vectors, dismissed, positive)
+            if self.tail.shape[0]:
+                adjustments = np.concatenate([adjustments, feedback_adjustments(self.tail, dismissed, positive)])
+            positions = np.flatnonzero(adjustments)
+            cached = (positions, adjustments[positions])
+            self._feedback[key] = cached
+            while len(self._feedback) > FEEDBACK_ADJUSTMENTS_CACHE_SIZE:
+                self._feedback.popitem(last=False)
+            return cached
+
+    def eligible(self, user_profile: Optional[Dict[str, Any]], diagnostics: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+        """Row mask of live grants the user can apply to, or None when hard filters do not apply"""
+        if not HARD_FILTERS_ENABLED or not user_profile or not self.ids:
+            return None
+        mask, counts = eligibility_mask(self.features, user_profile, self.alive)
+        if diagnostics is not None:
+            diagnostics['eligibility_filters'] = counts
+        return mask
+
+    def boosts_for(self, user_profile: Optional[Dict[str, Any]], grant_ids: List[str]) -> np.ndarray:
+        """Hybrid boosts for specific grants (0.0 for ids no longer in the index)"""
+        with self._lock:
+            boosts = self.compute_boosts(user_profile)
+            return np.asarray([
+                boosts[self.positions[grant_id]] if grant_id in self.positions else 0.0 for grant_id in grant_ids
+            ], dtype=np.float64)
+
+    def score(self, query_embedding: np.ndarray, user_profile: Optional[Dict[str, Any]] = None, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity plus hybrid boosts for every row; tombstoned and masked-out rows score -inf"""
+        if not self.ids:
+            return np.zeros(0, dtype=np.float64)
+
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        n = len(self.ids)
+        if norm == 0:
+            similarities = np.zeros(n, dtype=np.float64)
+        else:
+            query = query / norm
+            if mask is not None and np.count_nonzero(mask) < GATHER_FRACTION * n:
+                # Few eligible rows: only multiply those instead of the whole matrix
+                rows = np.flatnonzero(mask)
+                similarities = np.zeros(n, dtype=np.float64)
+                similarities[rows] = self._gather(rows) @ query
+            else:
+                similarities = (self.vectors @ query).astype(np.float64)
+                if self.tail.shape[0]:
+                    similarities = np.concatenate([similarities, self.tail @ query])
+
+        scores = similarities + self.compute_boosts(user_profile)
+        if mask is not None:
+            scores[~mask] = -np.inf
+        elif self.tombstones:
+            scores[~self.alive] = -np.inf
+        return scores
+
+    def top_k(self, scores: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        """Return the top_k (grant_id, score) pairs, highest first, ties in index order; -inf rows are never returned"""
+        return [(self.ids[i], score) for i, score in self._ranked(scores, top_k)]
+
+    def _gather(self, positions: np.ndarray) -> np.ndarray:
+        """Rows at the given positions, reading from the base matrix and the tail"""
+        base_rows = self.vectors.shape[0]
+        if not self.tail.shape[0]:
+            return self.vectors[positions]
+        in_base = positions < base_rows
+        rows = np.empty((positions.size, self.dim), dtype=np.float32)
+        rows[in_base] = self.vectors[positions[in_base]]
+        rows[~in_base] = self.tail[positions[~in_base] - base_rows]
+        return rows
+
+    def _rows(self, start: int, stop: int) -> np.ndarray:
+        """Contiguous rows [start, stop), spanning the base matrix and the tail"""
+        base_rows = self.vectors.shape[0]
+        if stop <= base_rows:
+            return self.vectors[start:stop]
+        if start >= base_rows:
+            return self.tail[start - base_rows:stop - base_rows]
+        return np.vstack([self.vectors[start:], self.tail[:stop - base_rows]])
+
+    def _score_shard(self, start: int, stop: int, query: np.ndarray, boosts: np.ndarray, live: Optional[np.ndarray],
+                     top_k: int) -> List[Tuple[float, int]]:
+        """Best top_k rows of one shard as (-score, position) pairs, in ranked order"""
+        scores = (self._rows(start, stop) @ query).astype(np.float64) + boosts[start:stop]
+        if live is not None:
+            scores[~live[start:stop]] = -np.inf
+        return [(-score, start + i) for i, score in self._ranked(scores, top_k)]
+
+    @staticmethod
+    def _ranked(scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """(row, score) for the top_k finite scores, highest first, ties in row order"""
+        top_k = min(top_k, int(np.count_nonzero(scores > -np.inf)))
+        if top_k <= 0:
+            return []
+        if top_k < scores.shape[0]:
+            # argpartition finds the k-th best score; keep every row tied with it so
+            # the final ordering matches a full stable sort
+            kth = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(scores.shape[0])
+        order = candidates[np.lexsort((candidates, -scores[candidates]))][:top_k]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def _search_sharded(self, query: np.ndarray, user_profile: Optional[Dict[str, Any]], top_k: int,
+                        mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Exact search with the rows split into SEARCH_SHARDS shards scored in parallel"""
+        n = len(self.ids)
+        boosts = self.compute_boosts(user_profile)
+        live = mask if mask is not None else (self.alive if self.tombstones else None)
+        bounds = np.linspace(0, n, SEARCH_SHARDS + 1).astype(int)
+        futures = [
+            _shard_pool().submit(self._score_shard, start, stop, query, boosts, live, top_k)
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+        ]
+        # Each partial list is sorted by (-score, position), so merging keeps the global order
+        merged = heapq.merge(*(future.result() for future in futures))
+        return [(self.ids[position], -score) for score, position in itertools.islice(merged, top_k)]
+
+    def attach_ann(self, ann: IVFIndex, snapshot_ids: Optional[List[str]] = None, snapshot_cells: Optional[np.ndarray] = None):
+        """Assign every row to an IVF cell, reusing snapshot assignments for unchanged grants"""
+        with self._lock:
+            cells = np.empty(len(self.ids), dtype=np.int32)
+            known = dict(zip(snapshot_ids, snapshot_cells.tolist())) if snapshot_ids is not None else {}
+            missing = []
+            for position, grant_id in enumerate(self.ids):
+                cell = known.get(grant_id)
+                if cell is None:
+                    missing.append(position)
+                else:
+                    cells[position] = cell
+            if len(missing) == len(self.ids):
+                base = ann.assign(self.vectors)
+                cells[:base.size] = base
+                cells[base.size:] = ann.assign(self.tail)
+            elif missing:
+                missing = np.asarray(missing, dtype=np.int64)
+                cells[missing] = ann.assign(self._gather(missing))
+            self.cells = cells
+            self.ann = ann
+
+    def train_ann(self, nlist: int = 0) -> IVFIndex:
+        """Fit an IVF quantizer on (a sample of) the live rows, base matrix and tail alike"""
+        with self._lock:
+            live = np.flatnonzero(self.alive)
+            sample = live
+            if live.size > ANN_TRAIN_SAMPLE:
+                sample = np.sort(np.random.default_rng(0).choice(live, size=ANN_TRAIN_SAMPLE, replace=False))
+            vectors = self._gather(sample)
+        return IVFIndex.train(vectors, nlist=nlist, trained_size=live.size)
+
+    def measure_ann_recall(self, samples: int = ANN_RECALL_SAMPLES, k: int = 10, seed: int = 0) -> Optional[float]:
+        """
+        Mean recall@k of the IVF cell probe against exact similarity, using sampled grants as
+        queries (each excluded from its own results), so the nprobe setting can be checked.
+        """
+        with self._lock:
+            live = np.flatnonzero(self.alive)
+            if self.ann is None or samples <= 0 or live.size <= k:
+                return None
+            rows = np.random.default_rng(seed).choice(live, size=min(samples, live.size), replace=False)
+            recalls = []
+            for row in rows:
+                query = self._gather(np.asarray([row]))[0]
+                exact = self.score(query)
+                exact[row] = -np.inf
+                candidates = np.flatnonzero(np.isin(self.cells, self.ann.probe(query, ANN_NPROBE)) & self.alive)
+                candidates = candidates[candidates != row]
+                recalls.append(recall_at_k(exact, candidates[np.argsort(-exact[candidates])], k))
+            return round(float(np.mean(recalls)), 4)
+
+    def _search_ann(self, query: np.ndarray, user_profile: Optional[Dict[str, Any]], top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Recall candidates from the closest IVF cells by similarity, then rerank them with boosts"""
+        cells = self.ann.probe(query, ANN_NPROBE)
+        candidates = np.flatnonzero(np.isin(self.cells, cells) & (self.alive if mask is None else mask))
+        if candidates.size == 0:
+            return []
+
+        similarities = (self._gather(candidates) @ query).astype(np.float64)
+        recall_k = max(ANN_RECALL_K, top_k)
+        if candidates.size > recall_k:
+            keep = np.argpartition(-similarities, recall_k - 1)[:recall_k]
+            candidates, similarities = candidates[keep], similarities[keep]
+
+        scores = similarities + self.compute_boosts(user_profile)[candidates]
+        order = np.lexsort((candidates, -scores))[:top_k]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in order]
+
+    def attach_quantized(self, mode: str):
+        """Encode every row for the quantized first pass and move private float32 rows out of process memory"""
+        with self._lock:
+            self.quantized = QuantizedVectors.build(mode, self.vectors, self.tail)
+            if not self.shared and not self.spilled:
+                # Rescoring reads only RESCORE_K rows per query, so the rows can live in a file mapping
+                rows = self.vectors.shape[0]
+                blocks = (self.vectors[start:start + 8192] for start in range(0, rows, 8192))
+                self.vectors = _spill_rows(blocks, rows, self.dim)
+                self.tail = np.zeros((0, self.dim), dtype=np.float32)
+                self.spilled = True
+
+    def _search_quantized(self, query: np.ndarray, user_profile: Optional[Dict[str, Any]], top_k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Rank all rows on the quantized codes, then re-score the best RESCORE_K exactly"""
+        live = self.alive if mask is None else mask
+        boosts = self.compute_boosts(user_profile)
+        approximate = self.quantized.similarities(query) + boosts
+        if mask is not None or self.tombstones:
+            approximate[~live] = -np.inf
+
+        rescore_k = min(max(RESCORE_K, top_k), int(np.count_nonzero(live)))
+        if rescore_k <= 0:
+            return []
+        if rescore_k < approximate.shape[0]:
+            candidates = np.argpartition(-approximate, rescore_k - 1)[:rescore_k]
+        else:
+            candidates = np.arange(approximate.shape[0])
+        candidates = np.sort(candidates[live[candidates]])
+
+        scores = (self._gather(candidates) @ query).astype(np.float64) + boosts[candidates]
+        order = np.lexsort((candidates, -scores))[:top_k]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in order]
+
+    def search(self, query_embedding: np.ndarray, user_profile: Optional[Dict[str, Any]] = None, top_k: int = 10,
+               exact: bool = False, diagnostics: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Return the ranked top_k (grant_id, score) pairs; approximate when an IVF or quantized index is attached.
+        Pass a diagnostics dict to receive how many grants each hard filter eliminated.
+        """
+        with self._lock:
+            mask = self.eligible(user_profile, diagnostics)
+            if (self.ann is not None or self.quantized is not None) and not exact:
+                query = np.asarray(query_embedding, dtype=np.float32).ravel()
+                norm = np.linalg.norm(query)
+                if norm > 0:
+                    if self.ann is not None:
+                        return self._search_ann(query / norm, user_profile, top_k, mask)
+                    return self._search_quantized(query / norm, user_profile, top_k, mask)
+            if self._shardable(mask):
+                query = np.asarray(query_embedding, dtype=np.float32).ravel()
+                norm = np.linalg.norm(query)
+                if norm > 0:
+                    return self._search_sharded(query / norm, user_profile, top_k, mask)
+            return self.top_k(self.score(query_embedding, user_profile, mask), top_k)
+
+    def _shardable(self, mask: Optional[np.ndarray]) -> bool:
+        """Shard exact scoring for large indexes, unless a sparse mask makes gathering cheaper"""
+        n = len(self.ids)
+        if SEARCH_SHARDS <= 1 or n < SHARD_MIN_GRANTS:
+            return False
+        return mask is None or np.count_nonzero(mask) >= GATHER_FRACTION * n
+
+    def search_batch(self, query_embeddings: np.ndarray, user_profiles: Optional[List[Optional[Dict[str, Any]]]] = None,
+                     top_k: int = 10, diagnostics: Optional[List[Dict[str, Any]]] = None) -> List[List[Tuple[str, float]]]:
+        """
+        Rank the grants for many queries at once (e.g. the weekly matching cycle).
+        Queries are scored exactly with one matrix-matrix product per block, sized so the
+        block's similarity matrix and per-profile boosts and masks stay within
+        GRANT_BATCH_BLOCK_MB. Boosts and eligibility masks are computed once per distinct
+        profile in a block and dropped with it.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        n_queries = queries.shape[0]
+        user_profiles = user_profiles or [None] * n_queries
+        if len(user_profiles) != n_queries:
+            raise ValueError(f"Got {n_queries} queries but {len(user_profiles)} user profiles")
+
+        queries = _normalize_rows(queries.copy())
+        results: List[List[Tuple[str, float]]] = []
+
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return [[] for _ in range(n_queries)]
+            # Per query: a float32 similarity column, and at worst float64 boosts plus a bool mask
+            block_size = max(1, (BATCH_BLOCK_MB << 20) // (n * (4 + 8 + 1)))
+
+            for start in range(0, n_queries, block_size):
+                block = queries[start:start + block_size]
+                per_profile: Dict[str, Tuple[np.ndarray, Optional[np.ndarray], Dict[str, Any]]] = {}
+                similarities = self.vectors @ block.T
+                if self.tail.shape[0]:
+                    similarities = np.vstack([similarities, self.tail @ block.T])
+
+                for j, user_profile in enumerate(user_profiles[start:start + block_size]):
+                    key = json.dumps(user_profile, sort_keys=True, default=str)
+                    if key not in per_profile:
+                        details: Dict[str, Any] = {}
+                        mask = self.eligible(user_profile, details)
+                        per_profile[key] = (self.compute_boosts(user_profile), mask, details)
+                    boosts, mask, details = per_profile[key]
+
+                    scores = similarities[:, j].astype(np.float64) + boosts
+                    if mask is not None:
+                        scores[~mask] = -np.inf
+                    elif self.tombstones:
+                        scores[~self.alive] = -np.inf
+                    results.append(self.top_k(scores, top_k))
+                    if diagnostics is not None:
+                        diagnostics.append(details)
+
+        return results
+
+
+_index: Optional[GrantIndex] = None
+_index_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _shard_pool() -> ThreadPoolExecutor:
+    """Process-wide thread pool for shard scoring"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS or os.cpu_count() or 1, thread_name_prefix="grant-shard")
+    return _pool
+
+
+def _ann_snapshot_path() -> Optional[str]:
+    if ANN_INDEX_PATH:
+        return ANN_INDEX_PATH
+    return os.path.join(STORE_DIR, "ivf.npz") if STORE_DIR else None
+
+
+def _maybe_attach_ann(index: GrantIndex):
+    """Attach (or retrain) the IVF recall index once the corpus is large enough for it to pay off"""
+    if len(index) < ANN_MIN_GRANTS:
+        index.ann = None
+        index.ann_recall = None
+        return
+    # Incremental inserts reuse the trained cells until the corpus doubles
+    if index.ann is not None and len(index) <= 2 * index.ann.trained_size:
+        return
+
+    path = _ann_snapshot_path()
+    if index.ann is None and path:
+        try:
+            snapshot = IVFIndex.load(path)
+            if snapshot is not None:
+                ann, ids, cells = snapshot
+                if ann.dim == index.dim and len(index) <= 2 * ann.trained_size:
+                    index.attach_ann(ann, ids, cells)
+                    logger.info(f"Loaded IVF snapshot with {ann.nlist} cells from {path}")
+                    return
+        except Exception as e:
+            logger.warning(f"Could not load IVF snapshot {path}, retraining: {e}")
+
+    ann = index.train_ann(nlist=ANN_NLIST)
+    index.attach_ann(ann)
+    index.ann_recall = None
+    if path:
+        try:
+            ann.save(path, index.ids, index.cells)
+        except Exception as e:
+            logger.warning(f"Could not save IVF snapshot to {path}: {e}")
+
+
+def _maybe_quantize(index: GrantIndex):
+    """Build the quantized first-pass codes and log the memory they hold (recall is measured on demand)"""
+    if QUANTIZATION_MODE == "none" or len(index) == 0:
+        return
+    try:
+        index.attach_quantized(QUANTIZATION_MODE)
+        logger.info(f"Quantized grant index: {quantization_report(index)}")
+    except Exception as e:
+        logger.error(f"Could not quantize grant index, using exact float32 scoring: {e}")
+        index.quantized = None
+
+
+def _load_index(db: Session) -> GrantIndex:
+    """Map the published embedding store when one is configured, otherwise build from the database"""
+    index = None
+    if STORE_DIR:
+        try:
+            store = EmbeddingStore.open(STORE_DIR)
+            if store is not None:
+                index = GrantIndex.from_store(store)
+                index.refresh(db)
+        except Exception as e:
+            logger.error(f"Could not open embedding store in {STORE_DIR}, building from database: {e}")
+            index = None
+    if index is None:
+        index = GrantIndex.build(db)
+    _maybe_quantize(index)
+    _maybe_attach_ann(index)
+    return index
+
+
+def get_grant_index(db: Session) -> GrantIndex:
+    """Return the process-wide grant index, building it on first use and delta-refreshing it when due"""
+    global _index
+    index = _index
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_index(db)
+            index = _index
+    elif time.time() - index.refreshed_at >= REFRESH_INTERVAL_SECONDS and not index._refresh_lock.locked():
+        # Only one request pays for the refresh; concurrent ones keep serving the current rows
+        version = EmbeddingStore.current_version(STORE_DIR) if STORE_DIR else None
+        if version not in (None, index.store_version):
+            # A newer store was published: switch over without restarting the worker.
+            # Requests arriving meanwhile keep serving the old index instead of queueing a reload.
+            index.refreshed_at = time.time()
+            with _index_lock:
+                if _index.store_version != version:
+                    _index = _load_index(db)
+                index = _index
+        else:
+            index.refresh(db)
+            _maybe_attach_ann(index)
+    return index
+
+
+def refresh_grant_index(db: Session, full: bool = False) -> Dict[str, int]:
+    """Force a delta refresh now, or reload the index from scratch when full=True"""
+    global _index
+    if pgvector_enabled(db):
+        # PostgreSQL ranks with the vector index, so there is no resident index to refresh
+        return {'size': 0, 'backend': 'pgvector'}
+    if full or _index is None:
+        with _index_lock:
+            _index = _load_index(db)
+        return {'size': len(_index), 'rebuilt': 1, 'store_version': _index.store_version}
+
+    stats = _index.refresh(db)
+    _maybe_attach_ann(_index)
+    stats['size'] = len(_index)
+    return stats
+
+
+def grant_index_stats(measure: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Size and layout of the loaded index for the admin dashboard (None if not loaded yet).
+    measure=True re-measures IVF and quantized recall first (exact scans, so only on request);
+    otherwise the last measurements are reported.
+    """
+    index = _index
+    if index is None:
+        return None
+    if measure and index.ann is not None:
+        index.ann_recall = index.measure_ann_recall()
+        logger.info(f"IVF recall@10 with nprobe={ANN_NPROBE} of {index.ann.nlist} cells: {index.ann_recall}")
+    if measure and index.quantized is not None:
+        index.quantization_recall = measure_quantized_recall(index)
+    quantization = None
+    if index.quantized is not None:
+        quantization = dict(quantization_report(index), **{"recall@10": index.quantization_recall})
+    return {
+        "grants": len(index),
+        "tombstones": index.tombstones,
+        "store_version": index.store_version,
+        "corpus_version": index.corpus_version,
+        "ann_cells": index.ann.nlist if index.ann is not None else None,
+        "ann_nprobe": ANN_NPROBE if index.ann is not None else None,
+        "ann_recall_at_10": index.ann_recall,
+        "quantization": quantization,
+        "search_shards": SEARCH_SHARDS if index._shardable(None) else 1,
+        "next_expiry": (
+            datetime.fromtimestamp(index._expiry[0][0], timezone.utc).isoformat() if index._expiry else None
+        ),
+    }
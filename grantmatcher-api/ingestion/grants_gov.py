@@ -6,6 +6,8 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Grant, IngestionRun
+from ingestion.expiry import close_expired_grants
+from ingestion.embeddings import flag_changed_text
 import uuid
 
 # Configure logging
@@ -246,6 +248,7 @@ class GrantsGovIngester:
             'new': 0,
             'updated': 0,
             'closed': 0,
+            'reembed': 0,
             'errors': 0
         }
 
@@ -299,6 +302,9 @@ class GrantsGovIngester:
                                 if key != 'id' and hasattr(existing_grant, key):
                                     setattr(existing_grant, key, value)
                             existing_grant.updated_at = datetime.now(timezone.utc)
+                            # Queue for re-embedding only if the embedded text changed
+                            if flag_changed_text(existing_grant):
+                                stats['reembed'] += 1
                             stats['updated'] += 1
                         else:
                             # Create new grant
@@ -327,6 +333,9 @@ class GrantsGovIngester:
             # Final commit
             db.commit()
 
+            # Retire grants whose deadline has passed (fetched ones included)
+            stats['closed'] = close_expired_grants(db)
+
             # Update ingestion run
             ingestion_run.completed_at = datetime.now(timezone.utc)
             ingestion_run.grants_fetched = stats['fetched']
@@ -0,0 +1,208 @@
+import logging
+import hashlib
+import os
+import time
+import numpy as np
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import select, insert, delete, or_
+from sqlalchemy.orm import Session
+from database import get_db
+from models import User, Grant, MatchResult
+from ingestion.grant_index import get_grant_index
+from ingestion.pgvector_search import pgvector_enabled, pgvector_boosts
+from ingestion.vector_search import VectorSearch, CARD_COLUMNS
+from ingestion.vector_codec import encode_vector, decode_vector
+from ingestion.feedback import get_feedback_cache
+
+logger = logging.getLogger(__name__)
+
+# Length of each user's materialized ranked list in match_results
+MATCH_RESULTS_LIMIT = int(os.getenv("GRANT_MATCH_RESULTS_LIMIT", "200"))
+
+
+def match_explanation(score: float, source: str = "mission") -> str:
+    return f"Matches your {source} with {round(score * 100, 1)}% relevance"
+
+
+def build_user_query(user: User) -> Optional[str]:
+    """Search text for a user's profile-based matches (None if the profile is too empty to match)"""
+    query_parts = []
+    for attr in ['mission_statement', 'organization_name']:
+        val = getattr(user, attr, None)
+        if val:
+            query_parts.append(val)
+
+    focus_areas = getattr(user, 'focus_areas', None)
+    if focus_areas and isinstance(focus_areas, list):
+        query_parts.extend(focus_areas)
+
+    return " ".join(query_parts) if query_parts else None
+
+
+def build_user_profile(user: User, feedback: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+    """Profile fields used for hybrid boosts and hard eligibility filters, plus the user's match feedback"""
+    profile = {
+        "organization_type": user.organization_type,
+        "focus_areas": user.focus_areas,
+        "annual_budget": user.annual_budget,
+        "eligibility_attributes": user.eligibility_attributes,
+        "funding_preferences": user.funding_preferences,
+    }
+    if feedback:
+        profile["feedback"] = feedback
+    return profile
+
+
+def profile_fingerprint(query: str, model_name: str) -> str:
+    """Identifies the model and profile text a stored profile vector was computed from"""
+    return hashlib.sha256(f"{model_name}\n{query}".encode("utf-8")).hexdigest()
+
+
+def user_embeddings(db: Session, users: List[User], search: VectorSearch) -> Dict[str, np.ndarray]:
+    """
+    Profile vectors for the given users, keyed by user id (users with empty profiles are left out).
+    Stored vectors are reused while their fingerprint matches; the rest are encoded in one
+    model call and written back.
+    """
+    vectors, stale = {}, []
+    for user in users:
+        query = build_user_query(user)
+        if not query:
+            continue
+        fingerprint = profile_fingerprint(query, search.model_name)
+        if user.embedding is not None and user.embedding_fingerprint == fingerprint:
+            try:
+                vectors[user.id] = decode_vector(user.embedding)
+                continue
+            except ValueError as e:
+                logger.warning(f"Discarding stored profile embedding for user {user.id}: {e}")
+        stale.append((user, query, fingerprint))
+
+    if stale:
+        now = datetime.now(timezone.utc)
+        for (user, _, fingerprint), vector in zip(stale, search.encode_queries([query for _, query, _ in stale])):
+            user.embedding = encode_vector(vector)
+            user.embedding_fingerprint = fingerprint
+            user.embedding_model = search.model_name
+            user.embedding_updated_at = now
+            vectors[user.id] = vector
+        db.commit()
+        logger.info(f"Recomputed {len(stale)} profile embeddings")
+    return vectors
+
+
+def materialize_matches(db: Session, users: List[User], search: VectorSearch, limit: int = MATCH_RESULTS_LIMIT) -> Dict[str, int]:
+    """
+    Rank the grants for each user (one batched search) and replace their rows in match_results.
+    is_new marks grants that were not in the user's previous list.
+    """
+    stats = {"users": 0, "rows": 0, "new": 0}
+    vectors = user_embeddings(db, users, search)
+    batch = [user for user in users if user.id in vectors]
+    if not batch:
+        return stats
+
+    feedback = get_feedback_cache().get_many(db, [user.id for user in batch])
+    profiles = [build_user_profile(user, feedback[user.id]) for user in batch]
+    ranked = search.search_batch(db, [vectors[user.id] for user in batch], profiles, limit, hydrate=False)
+    if pgvector_enabled(db):
+        boosts_for = lambda profile, grant_ids: pgvector_boosts(db, profile, grant_ids)
+    else:
+        boosts_for = get_grant_index(db).boosts_for
+
+    user_ids = [user.id for user in batch]
+    previous: Dict[str, set] = {user_id: set() for user_id in user_ids}
+    for user_id, grant_id in db.execute(select(MatchResult.user_id, MatchResult.grant_id).where(MatchResult.user_id.in_(user_ids))):
+        previous[user_id].add(grant_id)
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    for user, profile, scored in zip(batch, profiles, ranked):
+        bonuses = boosts_for(profile, [grant_id for grant_id, _ in scored])
+        for rank, ((grant_id, score), bonus) in enumerate(zip(scored, bonuses), start=1):
+            is_new = grant_id not in previous[user.id]
+            rows.append({
+                "user_id": user.id,
+                "grant_id": grant_id,
+                "rank": rank,
+                "score": score,
+                "semantic_similarity": score - float(bonus),
+                "eligibility_bonus": float(bonus),
+                "explanation": match_explanation(score),
+                "is_new": is_new,
+                "computed_at": now,
+            })
+            stats["new"] += is_new
+
+    db.execute(delete(MatchResult).where(MatchResult.user_id.in_(user_ids)))
+    if rows:
+        db.execute(insert(MatchResult), rows)
+    for user in batch:
+        user.touch()
+    db.commit()
+    stats["users"] = len(batch)
+    stats["rows"] = len(rows)
+    return stats
+
+
+def materialize_all_users(db: Session, search: VectorSearch, batch_size: int = 500) -> Dict[str, Any]:
+    """Re-materialize match_results for every user (scheduled job and after ingestion)"""
+    start = time.perf_counter()
+    stats = {"users": 0, "rows": 0, "new": 0}
+    user_ids = [user_id for (user_id,) in db.execute(select(User.id).order_by(User.id))]
+    for offset in range(0, len(user_ids), batch_size):
+        users = db.query(User).filter(User.id.in_(user_ids[offset:offset + batch_size])).all()
+        for key, value in materialize_matches(db, users, search).items():
+            stats[key] += value
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    logger.info(f"Materialized matches: {stats}")
+    return stats
+
+
+def invalidate_matches(db: Session, user: User):
+    """Drop a user's materialized list so the next dashboard read rebuilds it"""
+    db.execute(delete(MatchResult).where(MatchResult.user_id == user.id))
+    user.touch()
+    db.commit()
+
+
+def read_matches(db: Session, user: User, cursor: Optional[int] = None, limit: int = 10) -> Tuple[List[Any], Optional[int]]:
+    """
+    One page of a user's materialized matches, ordered by rank, as (rows, next_cursor).
+    The cursor is the last rank served; grants that closed since materialization are skipped.
+    """
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    query = (
+        select(*CARD_COLUMNS, MatchResult.rank, MatchResult.score, MatchResult.explanation, MatchResult.is_new)
+        .join(Grant, Grant.id == MatchResult.grant_id)
+        .where(
+            MatchResult.user_id == user.id,
+            MatchResult.rank > (cursor or 0),
+            Grant.status == 'active',
+            or_(Grant.close_date.is_(None), Grant.close_date >= today),
+        )
+        .order_by(MatchResult.rank)
+        .limit(limit + 1)
+    )
+    rows = db.execute(query).fetchall()
+    next_cursor = rows[limit - 1].rank if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def has_materialized_matches(db: Session, user: User) -> bool:
+    return db.execute(select(MatchResult.id).where(MatchResult.user_id == user.id).limit(1)).first() is not None
+
+
+def run_match_materialization():
+    """Standalone function to rebuild every user's match_results (e.g. a weekly or nightly cron)"""
+    db = next(get_db())
+    try:
+        stats = materialize_all_users(db, VectorSearch())
+        print(f"Match materialization complete: {stats}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_match_materialization()
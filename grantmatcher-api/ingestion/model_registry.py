@@ -0,0 +1,99 @@
+import gc
+import logging
+import os
+import threading
+import time
+import psutil
+from fastembed import TextEmbedding
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Model used for grant and profile embeddings unless a caller asks for another
+DEFAULT_MODEL_NAME = os.getenv("GRANT_EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+
+
+def _rss_mb() -> float:
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+
+
+class ModelRegistry:
+    """
+    One shared embedding model per model name for the whole process.
+
+    Models load lazily on first use; concurrent first calls for the same name wait for a
+    single load instead of each building an ONNX session. The instances are shared across
+    threads: ONNX Runtime sessions and the Rust tokenizer allow concurrent embed() calls.
+    Load time and the resident memory each load added are kept for the admin stats.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, TextEmbedding] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def get(self, model_name: str = DEFAULT_MODEL_NAME) -> TextEmbedding:
+        """The shared model for model_name, loading it on first use"""
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+        with load_lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._load(model_name)
+        return model
+
+    def loaded(self, model_name: str = DEFAULT_MODEL_NAME) -> Optional[TextEmbedding]:
+        """The shared model if it is already loaded; never loads (for paths that can do without it)"""
+        return self._models.get(model_name)
+
+    def _load(self, model_name: str) -> TextEmbedding:
+        logger.info(f"Loading embedding model: {model_name} (FastEmbed mode)")
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        try:
+            model = TextEmbedding(model_name=model_name)
+        except Exception as e:
+            with self._lock:
+                self._stats.setdefault(model_name, {})["last_error"] = str(e)
+            raise
+        gc.collect()
+        stats = {
+            "load_seconds": round(time.perf_counter() - start, 2),
+            "rss_added_mb": round(_rss_mb() - rss_before, 1),
+            "loaded_at": time.time(),
+        }
+        with self._lock:
+            self._models[model_name] = model
+            self._stats[model_name] = stats
+        logger.info(f"Embedding model {model_name} loaded in {stats['load_seconds']}s (+{stats['rss_added_mb']} MB RSS)")
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rss_mb": round(_rss_mb(), 1),
+                "models": {name: {"loaded": name in self._models, **stats} for name, stats in self._stats.items()},
+            }
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Process-wide embedding model registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
+
+
+def get_embedding_model(model_name: str = DEFAULT_MODEL_NAME) -> TextEmbedding:
+    """The process's shared embedding model for model_name (loaded on first use)"""
+    return get_model_registry().get(model_name)
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import select, func, inspect, text
+from sqlalchemy.orm import Session
+from models import Grant
+from ingestion.grant_features import GrantFeatures, FEATURE_COLUMNS, ELIGIBILITY_BOOST, FOCUS_BOOST_CAP
+from ingestion.eligibility import HARD_FILTERS_ENABLED, eligibility_mask
+from ingestion.feedback import feedback_adjustments, POSITIVE_BOOST
+
+logger = logging.getLogger(__name__)
+
+# memory | pgvector | auto (pgvector on PostgreSQL once the embedding_vector migration has run)
+SEARCH_BACKEND = os.getenv("GRANT_SEARCH_BACKEND", "auto")
+# Cosine candidates pulled from SQL per query before boosts and hard filters rerank them
+PGVECTOR_CANDIDATES = int(os.getenv("GRANT_PGVECTOR_CANDIDATES", "200"))
+# Candidate pool is doubled up to this size when the first pool cannot prove the top-k exact
+PGVECTOR_MAX_CANDIDATES = int(os.getenv("GRANT_PGVECTOR_MAX_CANDIDATES", "2000"))
+# HNSW search breadth / IVFFlat lists probed (pgvector caps hnsw.ef_search at 1000)
+PGVECTOR_EF_SEARCH = int(os.getenv("GRANT_PGVECTOR_EF_SEARCH", "100"))
+PGVECTOR_PROBES = int(os.getenv("GRANT_PGVECTOR_PROBES", "10"))
+# How long (seconds) the corpus version (watermark and active count) is reused before re-reading it
+CORPUS_VERSION_SECONDS = int(os.getenv("GRANT_PGVECTOR_VERSION_SECONDS", "60"))
+
+VECTOR_COLUMN = "embedding_vector"
+EMBEDDING_DIM = 384
+
+# Largest hybrid boost a grant can get, so no grant outside the candidates can outrank this margin
+MAX_BOOST = ELIGIBILITY_BOOST + FOCUS_BOOST_CAP + max(POSITIVE_BOOST, 0.0)
+
+_CANDIDATES_SQL = f"""
+    SELECT id, 1 - ({VECTOR_COLUMN} <=> CAST(:query AS vector)) AS similarity
+    FROM grants
+    WHERE status = 'active' AND {VECTOR_COLUMN} IS NOT NULL {{deadline}}
+    ORDER BY {VECTOR_COLUMN} <=> CAST(:query AS vector)
+    LIMIT :limit
+"""
+
+_available: Dict[str, bool] = {}
+_version: Dict[str, Tuple[float, str]] = {}
+_lock = threading.Lock()
+
+
+def vector_literal(vector: np.ndarray) -> str:
+    """pgvector text input for a query vector, e.g. '[0.1,-0.2,...]'"""
+    return "[" + ",".join(f"{x:.8g}" for x in np.asarray(vector, dtype=np.float32).ravel()) + "]"
+
+
+def pgvector_enabled(db: Session) -> bool:
+    """Whether searches should run in PostgreSQL (checked once per database)"""
+    if SEARCH_BACKEND == "memory":
+        return False
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        available = bind.dialect.name == "postgresql" and any(
+            column["name"] == VECTOR_COLUMN for column in inspect(bind).get_columns("grants")
+        )
+        if SEARCH_BACKEND == "pgvector" and not available:
+            logger.warning(f"GRANT_SEARCH_BACKEND=pgvector but grants.{VECTOR_COLUMN} is missing, using the in-memory index")
+        _available[key] = available
+        logger.info(f"Grant search backend: {'pgvector' if available else 'memory'}")
+    return _available[key]
+
+
+def pgvector_corpus_version(db: Session) -> str:
+    """
+    Watermark and size of the active, embedded corpus, re-read at most every
+    CORPUS_VERSION_SECONDS; stands in for GrantIndex.corpus_version when no index is loaded.
+    """
+    key = str(db.get_bind().url)
+    cached = _version.get(key)
+    if cached is not None and time.time() - cached[0] < CORPUS_VERSION_SECONDS:
+        return cached[1]
+    latest_update, latest_create, count = db.execute(
+        select(func.max(Grant.updated_at), func.max(Grant.created_at), func.count(Grant.id))
+        .where(Grant.status == 'active', text(f"{VECTOR_COLUMN} IS NOT NULL"))
+    ).one()
+    stamps = [s for s in (latest_update, latest_create) if s is not None]
+    version = f"{max(stamps).isoformat() if stamps else ''}/{count}"
+    with _lock:
+        _version[key] = (time.time(), version)
+    return version
+
+
+def _candidates(db: Session, query: str, limit: int, deadline: bool) -> List[Tuple[str, float]]:
+    """Cosine top-limit active grants, ranked by the vector index"""
+    db.execute(text(f"SET LOCAL hnsw.ef_search = {min(1000, max(PGVECTOR_EF_SEARCH, limit))}"))
+    db.execute(text(f"SET LOCAL ivfflat.probes = {PGVECTOR_PROBES}"))
+    sql = _CANDIDATES_SQL.format(deadline="AND (close_date IS NULL OR close_date >= :today)" if deadline else "")
+    params = {"query": query, "limit": limit}
+    if deadline:
+        params["today"] = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    return [(row.id, float(row.similarity)) for row in db.execute(text(sql), params)]
+
+
+def _load_features(db: Session, grant_ids: List[str]) -> Tuple[List[str], GrantFeatures]:
+    """Boost/filter features for the given grants, in order (ids no longer in the table are dropped)"""
+    rows = {row.id: row for row in db.execute(select(Grant.id, *FEATURE_COLUMNS).where(Grant.id.in_(grant_ids)))}
+    found = [grant_id for grant_id in grant_ids if grant_id in rows]
+    features = GrantFeatures()
+    features.append([rows[grant_id] for grant_id in found])
+    return found, features
+
+
+def _feedback_boosts(db: Session, feedback: Dict[str, List[str]], grant_ids: List[str]) -> np.ndarray:
+    """Feedback adjustments for specific grants; one query for their and the feedback grants' vectors"""
+    dismissed, positive = feedback.get("dismissed") or [], feedback.get("positive") or []
+    wanted = list(dict.fromkeys(grant_ids + dismissed + positive))
+    vectors = {}
+    for row in db.execute(text(f"SELECT id, {VECTOR_COLUMN}::text AS vector FROM grants WHERE id = ANY(:ids) AND {VECTOR_COLUMN} IS NOT NULL"),
+                          {"ids": wanted}):
+        vector = np.asarray(json.loads(row.vector), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vectors[row.id] = vector / norm if norm > 0 else vector
+
+    def matrix(ids: List[str]) -> np.ndarray:
+        rows = [vectors[grant_id] for grant_id in ids if grant_id in vectors]
+        return np.vstack(rows) if rows else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    present = [grant_id for grant_id in grant_ids if grant_id in vectors]
+    adjustments = dict(zip(present, feedback_adjustments(matrix(present), matrix(dismissed), matrix(positive))))
+    return np.asarray([adjustments.get(grant_id, 0.0) for grant_id in grant_ids], dtype=np.float64)
+
+
+def pgvector_boosts(db: Session, user_profile: Optional[Dict[str, Any]], grant_ids: List[str]) -> np.ndarray:
+    """Hybrid boosts for specific grants, like GrantIndex.boosts_for (0.0 for missing ids)"""
+    found, features = _load_features(db, grant_ids)
+    boosts = dict(zip(found, features.compute_boosts(user_profile)))
+    result = np.asarray([boosts.get(grant_id, 0.0) for grant_id in grant_ids], dtype=np.float64)
+    feedback = (user_profile or {}).get("feedback")
+    if feedback and grant_ids:
+        result += _feedback_boosts(db, feedback, grant_ids)
+    return result
+
+
+def search_pgvector(db: Session, query_embedding: np.ndarray, user_profile: Optional[Dict[str, Any]] = None, top_k: int = 10,
+                    diagnostics: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+    """
+    Rank grants in PostgreSQL: the HNSW/IVFFlat index returns the closest active grants by
+    cosine, then their boosts and hard filters are applied exactly as GrantIndex.search does.
+
+    Any grant outside the candidates is at most as similar as the weakest candidate, so
+    when the k-th hybrid score clears that similarity plus MAX_BOOST the result is the same
+    as ranking every grant; otherwise the pool is doubled up to PGVECTOR_MAX_CANDIDATES.
+    """
+    query = vector_literal(query_embedding)
+    filtered = HARD_FILTERS_ENABLED and bool(user_profile)
+    limit = max(PGVECTOR_CANDIDATES, top_k)
+    while True:
+        candidates = _candidates(db, query, limit, deadline=filtered)
+        if not candidates:
+            return []
+        ids = [grant_id for grant_id, _ in candidates]
+        found, features = _load_features(db, ids)
+        found = set(found)
+        candidates = [(grant_id, similarity) for grant_id, similarity in candidates if grant_id in found]
+
+        scores = np.asarray([similarity for _, similarity in candidates], dtype=np.float64)
+        scores += features.compute_boosts(user_profile)
+        feedback = (user_profile or {}).get("feedback")
+        if feedback:
+            scores += _feedback_boosts(db, feedback, [grant_id for grant_id, _ in candidates])
+        if filtered:
+            mask, counts = eligibility_mask(features, user_profile, np.ones(len(candidates), dtype=bool))
+            scores[~mask] = -np.inf
+            if diagnostics is not None:
+                diagnostics["eligibility_filters"] = counts
+
+        order = np.lexsort((np.arange(scores.size), -scores))
+        ranked = [(candidates[i][0], float(scores[i])) for i in order if scores[i] > -np.inf][:top_k]
+        exhausted = len(ids) < limit
+        floor = candidates[-1][1] + MAX_BOOST if candidates else -np.inf
+        if exhausted or limit >= PGVECTOR_MAX_CANDIDATES or (len(ranked) == top_k and ranked[-1][1] >= floor):
+            break
+        limit = min(limit * 2, PGVECTOR_MAX_CANDIDATES)
+
+    if diagnostics is not None:
+        diagnostics["search_backend"] = "pgvector"
+        diagnostics["pgvector_candidates"] = len(ids)
+    return ranked
@@ -0,0 +1,139 @@
+import logging
+import os
+import time
+import numpy as np
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# First-pass representation for exact scoring: "none", "int8" or "binary"
+QUANTIZATION_MODE = os.getenv("GRANT_QUANTIZATION", "none").lower()
+# Candidates re-scored with the exact float32 vectors after the quantized pass
+RESCORE_K = int(os.getenv("GRANT_QUANTIZATION_RESCORE_K", "300"))
+
+# popcount lookup for NumPy versions without np.bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits: np.ndarray) -> np.ndarray:
+    """Per-element count of set bits for uint8 arrays"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits)
+    return _POPCOUNT_TABLE[bits]
+
+
+class QuantizedVectors:
+    """
+    Compact copy of the grant matrix used for a cheap first scoring pass. The codes are what
+    stays resident: the float32 rows the rescoring pass reads are mapped from the published
+    store or spilled to a temporary file (see GrantIndex.attach_quantized), so only the
+    rescored candidates' pages are touched per query.
+
+    int8: per-dimension symmetric scale, codes = round(x / scale), ~4x smaller than float32.
+    binary: 1 sign bit per dimension packed into bytes, ~32x smaller; similarity is
+    estimated from the Hamming distance as cos(pi * hamming / dim).
+    Rows must already be L2-normalized.
+    """
+
+    def __init__(self, mode: str, dim: int, scales: np.ndarray = None):
+        if mode not in ("int8", "binary"):
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.mode = mode
+        self.dim = dim
+        self.scales = scales
+        width = dim if mode == "int8" else (dim + 7) // 8
+        self.codes = np.zeros((0, width), dtype=np.int8 if mode == "int8" else np.uint8)
+
+    @classmethod
+    def build(cls, mode: str, *blocks: np.ndarray, block_size: int = 8192) -> "QuantizedVectors":
+        """Encode the given row blocks (e.g. base matrix and tail) in order"""
+        dim = blocks[0].shape[1]
+        scales = None
+        if mode == "int8":
+            max_abs = np.zeros(dim, dtype=np.float32)
+            for block in blocks:
+                for start in range(0, block.shape[0], block_size):
+                    max_abs = np.maximum(max_abs, np.abs(block[start:start + block_size]).max(axis=0, initial=0))
+            scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+        quantized = cls(mode, dim, scales)
+        parts = [
+            quantized.encode(np.asarray(block[start:start + block_size], dtype=np.float32))
+            for block in blocks
+            for start in range(0, block.shape[0], block_size)
+        ]
+        if parts:
+            quantized.codes = np.vstack(parts)
+        return quantized
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        if self.mode == "int8":
+            return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+        return np.packbits(vectors > 0, axis=1)
+
+    def set_rows(self, positions, vectors: np.ndarray):
+        self.codes[positions] = self.encode(vectors)
+
+    def append(self, vectors: np.ndarray):
+        self.codes = np.vstack([self.codes, self.encode(vectors)])
+
+    def take(self, positions: np.ndarray):
+        self.codes = self.codes[positions]
+
+    def similarities(self, query: np.ndarray, block_size: int = 16384) -> np.ndarray:
+        """Approximate cosine similarity of a normalized query against every row"""
+        n = self.codes.shape[0]
+        out = np.empty(n, dtype=np.float64)
+        if self.mode == "int8":
+            scaled_query = (query * self.scales).astype(np.float32)
+            for start in range(0, n, block_size):
+                out[start:start + block_size] = self.codes[start:start + block_size].astype(np.float32) @ scaled_query
+        else:
+            query_bits = np.packbits(query > 0)
+            for start in range(0, n, block_size):
+                hamming = popcount(np.bitwise_xor(self.codes[start:start + block_size], query_bits)).sum(axis=1)
+                out[start:start + block_size] = np.cos(np.pi * hamming / self.dim)
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+
+def quantization_report(index) -> Dict[str, Any]:
+    """Memory held by the quantized index and the first-pass scan size (cheap, no searches)"""
+    n = len(index.ids)
+    float_bytes = n * index.dim * 4
+    code_bytes = index.quantized.nbytes
+    # Store-mapped or spilled float32 rows live in the page cache; only appended tail rows are private
+    resident_float_bytes = index.tail.nbytes if index.shared or index.spilled else float_bytes
+    return {
+        "mode": index.quantized.mode,
+        "grants": n,
+        "float32_bytes": float_bytes,
+        "float32_backing": "store" if index.shared else ("spill" if index.spilled else "memory"),
+        "quantized_bytes": code_bytes,
+        "resident_bytes": resident_float_bytes + code_bytes,
+        # How many times fewer bytes the first pass reads per query than a float32 pass
+        "first_pass_scan_ratio": round(float_bytes / code_bytes, 1) if code_bytes else None,
+        "rescore_k": RESCORE_K,
+    }
+
+
+def measure_quantized_recall(index, sample_queries: int = 100, k: int = 10, seed: int = 0) -> Optional[float]:
+    """Mean recall@k of the quantized search against exact scoring, using sampled grants as queries"""
+    start = time.perf_counter()
+    with index._lock:
+        live = np.flatnonzero(index.alive)
+        if index.quantized is None or sample_queries <= 0 or live.size == 0:
+            return None
+        rows = np.random.default_rng(seed).choice(live, size=min(live.size, sample_queries), replace=False)
+        recall = 0.0
+        for position in rows:
+            query = index._gather(np.asarray([position]))[0]
+            approximate = {grant_id for grant_id, _ in index._search_quantized(query, None, k)}
+            exact = {grant_id for grant_id, _ in index.search(query, top_k=k, exact=True)}
+            recall += len(approximate & exact) / max(len(exact), 1)
+    recall = round(recall / len(rows), 4)
+    logger.info(f"Quantized ({index.quantized.mode}) recall@{k}: {recall} in {time.perf_counter() - start:.2f}s")
+    return recall
@@ -0,0 +1,109 @@
+import logging
+import os
+import re
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# In-memory entries kept per process (0 disables the cache)
+QUERY_CACHE_SIZE = int(os.getenv("GRANT_QUERY_CACHE_SIZE", "2048"))
+# Entries older than this are re-encoded
+QUERY_CACHE_TTL_SECONDS = int(os.getenv("GRANT_QUERY_CACHE_TTL_SECONDS", "86400"))
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query text: case- and whitespace-insensitive"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query text -> float32 embedding, keyed by model name.
+
+    Entries expire after ttl_seconds. This is the in-process tier only: VectorSearch sends
+    misses through the shared on-disk embedding cache (ingestion.embedding_cache) before the
+    model, which is what keeps warm queries across restarts and workers.
+    Cached vectors are read-only; callers must copy before modifying them.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl_seconds: int = QUERY_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Cached embedding for a query, or None (counted as a miss)"""
+        if self.max_size <= 0:
+            return None
+        key = (model_name, normalize_query(text))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, model_name: str, text: str, vector: np.ndarray) -> np.ndarray:
+        """Cache a freshly encoded query embedding; returns the stored read-only float32 copy"""
+        vector = np.array(vector, dtype=np.float32).ravel()
+        vector.setflags(write=False)
+        if self.max_size <= 0:
+            return vector
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            self._insert(key, time.time(), vector)
+        return vector
+
+    def _insert(self, key: Tuple[str, str], created_at: float, vector: np.ndarray):
+        self._entries[key] = (created_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_cache: Optional[QueryEmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """Process-wide query embedding cache shared by every VectorSearch"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryEmbeddingCache()
+    return _cache
@@ -0,0 +1,116 @@
+import logging
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ranked result lists kept per process (0 disables the cache)
+RESULT_CACHE_SIZE = int(os.getenv("GRANT_RESULT_CACHE_SIZE", "1024"))
+
+# Profile fields that change boosts or hard filters, and so the ranking
+RANKING_PROFILE_FIELDS = ("organization_type", "focus_areas", "eligibility_attributes", "funding_preferences", "feedback")
+
+
+def result_cache_key(query_embedding: np.ndarray, user_profile: Optional[Dict[str, Any]], top_k: int) -> str:
+    """Hash of the query vector, the profile's ranking inputs, the current day (deadline filter) and top_k"""
+    digest = hashlib.sha1(np.asarray(query_embedding, dtype="<f4").tobytes())
+    profile = {field: (user_profile or {}).get(field) for field in RANKING_PROFILE_FIELDS}
+    digest.update(json.dumps(profile, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(f"|{datetime.now(timezone.utc).date().isoformat()}|{top_k}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of hydrated search results, scoped to one corpus version.
+
+    Entries are only valid for the corpus version they were computed against; the first
+    lookup after the grant index changes drops them all, so stale rankings are never
+    served and nothing has to be flushed by hand.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.corpus_version: Optional[int] = None
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # How /api/matches requests were answered: materialized, result_cache or live
+        self.requests: Dict[str, int] = {"materialized": 0, "result_cache": 0, "live": 0}
+
+    def _check_version(self, corpus_version: int):
+        if corpus_version != self.corpus_version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info(f"Corpus version {self.corpus_version} -> {corpus_version}, dropping {len(self._entries)} cached results")
+            self._entries.clear()
+            self.corpus_version = corpus_version
+
+    def get(self, key: str, corpus_version: int) -> Optional[Any]:
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            self._check_version(corpus_version)
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, corpus_version: int, value: Any):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._check_version(corpus_version)
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_request(self, served_by: str):
+        with self._lock:
+            self.requests[served_by] = self.requests.get(served_by, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            total_requests = sum(self.requests.values())
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "corpus_version": self.corpus_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "match_requests": dict(self.requests),
+                # Share of /api/matches requests answered without live ranking
+                "absorbed": round(1 - self.requests["live"] / total_requests, 4) if total_requests else None,
+            }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide result cache for ad-hoc and not-yet-materialized searches"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
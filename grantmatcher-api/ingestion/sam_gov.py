@@ -7,6 +7,8 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Grant, IngestionRun
+from ingestion.expiry import close_expired_grants
+from ingestion.embeddings import flag_changed_text
 import uuid
 
 # Configure logging
@@ -118,7 +120,7 @@ class SAMGovIngester:
         db.add(run)
         db.commit()
         
-        stats = {'fetched': 0, 'new': 0, 'updated': 0, 'merged': 0, 'errors': 0}
+        stats = {'fetched': 0, 'new': 0, 'updated': 0, 'merged': 0, 'closed': 0, 'reembed': 0, 'errors': 0}
         
         try:
             offset = 0
@@ -167,7 +169,8 @@ class SAMGovIngester:
                                     existing_grant.summary = norm['summary']
                                 
                                 # Merge tags/json fields
-                                existing_grant.focus_areas = list(set((existing_grant.focus_areas or []) + (norm['focus_areas'] or [])))
+                                # (order-preserving, so an unchanged merge leaves the embedded text unchanged)
+                                existing_grant.focus_areas = list(dict.fromkeys((existing_grant.focus_areas or []) + (norm['focus_areas'] or [])))
                                 existing_grant.updated_at = datetime.now(timezone.utc)
                                 stats['merged'] += 1
                             else:
@@ -177,6 +180,9 @@ class SAMGovIngester:
                                         setattr(existing_grant, k, v)
                                 existing_grant.updated_at = datetime.now(timezone.utc)
                                 stats['updated'] += 1
+                            # Queue for re-embedding only if the embedded text changed
+                            if flag_changed_text(existing_grant):
+                                stats['reembed'] += 1
                         else:
                             # NEW entry
                             new_grant = Grant(**norm)
@@ -194,8 +200,10 @@ class SAMGovIngester:
                 offset += limit
                 
             db.commit()
+            stats['closed'] = close_expired_grants(db)
             run.status = 'completed'
             run.grants_fetched = stats['fetched']
+            run.grants_closed = stats['closed']
             run.completed_at = datetime.now(timezone.utc)
             db.commit()
             
@@ -0,0 +1,122 @@
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy import Column, Integer, MetaData, Table, Text, func, literal_column, select, text
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import Query, Session
+from models import Grant
+
+logger = logging.getLogger(__name__)
+
+# Terms of a search box query that are matched (as prefixes, all required)
+MAX_QUERY_TERMS = 16
+# Relevance weights for title, description and agency
+SQLITE_BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+# FTS5 index over grants (external content: the text lives only in grants, kept in sync by triggers)
+SQLITE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS grants_fts USING fts5("
+    "title, description, agency, content='grants', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS grants_fts_ai AFTER INSERT ON grants BEGIN "
+    "INSERT INTO grants_fts(rowid, title, description, agency) VALUES (new.rowid, new.title, new.description, new.agency); END",
+    "CREATE TRIGGER IF NOT EXISTS grants_fts_ad AFTER DELETE ON grants BEGIN "
+    "INSERT INTO grants_fts(grants_fts, rowid, title, description, agency) VALUES ('delete', old.rowid, old.title, old.description, old.agency); END",
+    "CREATE TRIGGER IF NOT EXISTS grants_fts_au AFTER UPDATE OF title, description, agency ON grants BEGIN "
+    "INSERT INTO grants_fts(grants_fts, rowid, title, description, agency) VALUES ('delete', old.rowid, old.title, old.description, old.agency); "
+    "INSERT INTO grants_fts(rowid, title, description, agency) VALUES (new.rowid, new.title, new.description, new.agency); END",
+)
+
+# Not part of Base.metadata: created by the migration (or ensure_sqlite_fts), never by create_all
+grants_fts = Table("grants_fts", MetaData(), Column("rowid", Integer), Column("title", Text))
+search_vector = literal_column("grants.search_vector")
+
+_available: Dict[str, Optional[str]] = {}
+_lock = threading.Lock()
+
+
+def query_terms(q: str) -> List[str]:
+    """Lower-cased word terms of a search box query"""
+    return re.findall(r"\w+", q.lower())[:MAX_QUERY_TERMS]
+
+
+def _sqlite_fts_in_sync(db: Session) -> bool:
+    """
+    Whether grants_fts still matches grants row for row. The index is keyed on the implicit
+    rowid of grants (its primary key is a string), which VACUUM is allowed to renumber.
+    """
+    try:
+        db.execute(text("INSERT INTO grants_fts(grants_fts, rank) VALUES ('integrity-check', 1)"))
+        return True
+    except DatabaseError:
+        db.rollback()
+        return False
+
+
+def ensure_sqlite_fts(db: Session) -> bool:
+    """
+    Create the FTS5 table and triggers if missing (development databases made by create_all),
+    and rebuild the index if the grants rowids moved under it (e.g. after a VACUUM)
+    """
+    exists = db.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'grants_fts'")).first()
+    try:
+        for statement in SQLITE_FTS_DDL:
+            db.execute(text(statement))
+        if not exists:
+            db.execute(text("INSERT INTO grants_fts(grants_fts) VALUES ('rebuild')"))
+            logger.info("Built SQLite FTS5 index for grants")
+        elif not _sqlite_fts_in_sync(db):
+            db.execute(text("INSERT INTO grants_fts(grants_fts) VALUES ('rebuild')"))
+            logger.warning("SQLite FTS5 index did not match grants (rowids changed, e.g. by VACUUM); rebuilt it")
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"SQLite FTS5 unavailable, grant search falls back to LIKE scans: {e}")
+        return False
+
+
+def text_search_backend(db: Session) -> Optional[str]:
+    """'postgresql', 'sqlite' or None (no full-text index; checked once per database)"""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        with _lock:
+            if key not in _available:
+                backend = None
+                if bind.dialect.name == "postgresql":
+                    found = db.execute(text(
+                        "SELECT 1 FROM information_schema.columns WHERE table_name = 'grants' AND column_name = 'search_vector'"
+                    )).first()
+                    backend = "postgresql" if found else None
+                elif bind.dialect.name == "sqlite":
+                    backend = "sqlite" if ensure_sqlite_fts(db) else None
+                _available[key] = backend
+    return _available[key]
+
+
+def apply_text_search(db: Session, query: Query, q: str) -> Optional[Query]:
+    """
+    Restrict a Grant query to full-text matches of q, most relevant first.
+    Every term must match as a prefix, so partially typed words still hit.
+    Returns None when the database has no full-text index or q has no searchable terms
+    (callers fall back to LIKE).
+    """
+    terms = query_terms(q)
+    backend = text_search_backend(db) if terms else None
+    if backend == "postgresql":
+        tsquery = func.to_tsquery("english", " & ".join(f"{term}:*" for term in terms))
+        # Stopwords are dropped by to_tsquery; an all-stopword query would match nothing
+        if not db.execute(select(func.numnode(tsquery))).scalar():
+            return None
+        return query.filter(search_vector.op("@@")(tsquery)).order_by(
+            func.ts_rank_cd(search_vector, tsquery).desc(), Grant.close_date.asc().nulls_last(), Grant.title.asc()
+        )
+    if backend == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        return query.join(grants_fts, grants_fts.c.rowid == literal_column("grants.rowid")).filter(
+            literal_column("grants_fts").op("MATCH")(match)
+        ).order_by(
+            func.bm25(literal_column("grants_fts"), *SQLITE_BM25_WEIGHTS), Grant.close_date.asc().nulls_last(), Grant.title.asc()
+        )
+    return None
@@ -0,0 +1,48 @@
+import json
+import struct
+import numpy as np
+from typing import Any, Optional
+
+# Compact binary form for embeddings stored in database columns:
+#   8-byte header: magic b"GV", format version, dtype code, dim (uint32)
+#   little-endian float32 values
+# ~1.5 KB for a 384-dim vector instead of ~8 KB of JSON text.
+MAGIC = b"GV"
+FORMAT_VERSION = 1
+DTYPE_FLOAT32 = 1
+HEADER = struct.Struct("<2sBBI")
+
+
+def encode_vector(vector: np.ndarray) -> bytes:
+    """Serialize a 1-d embedding to the binary column format"""
+    values = np.asarray(vector, dtype="<f4").ravel()
+    return HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_FLOAT32, values.size) + values.tobytes()
+
+
+def decode_vector(data: Optional[bytes]) -> Optional[np.ndarray]:
+    """Read a vector written by encode_vector (read-only view over the bytes); None for empty columns"""
+    if not data:
+        return None
+    magic, format_version, dtype_code, dim = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded embedding")
+    if format_version != FORMAT_VERSION or dtype_code != DTYPE_FLOAT32:
+        raise ValueError(f"Unsupported embedding encoding {format_version}/{dtype_code}")
+    if len(data) != HEADER.size + dim * 4:
+        raise ValueError(f"Encoded embedding is truncated: expected {dim} values")
+    return np.frombuffer(data, dtype="<f4", offset=HEADER.size, count=dim)
+
+
+def decode_grant_embedding(data: Optional[bytes], legacy: Any = None) -> Optional[np.ndarray]:
+    """
+    A grant's vector from grants.embedding, falling back to the legacy JSON list in
+    grants.embedding_data for rows the binary migration has not converted yet
+    """
+    if data:
+        return decode_vector(data)
+    if legacy is None:
+        return None
+    if isinstance(legacy, (str, bytes)):
+        # SQLite hands JSON columns back as text in raw selects
+        legacy = json.loads(legacy)
+    return np.asarray(legacy, dtype=np.float32)
@@ -1,33 +1,109 @@
 import logging
 import numpy as np
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Union
 from sqlalchemy.orm import Session
 from database import get_db
 from models import Grant
+from ingestion.grant_index import get_grant_index
+from ingestion.query_cache import get_query_cache
+from ingestion.embedding_cache import embed_with_cache
+from ingestion.result_cache import get_result_cache, result_cache_key
+from ingestion.pgvector_search import pgvector_enabled, pgvector_corpus_version, search_pgvector
+from ingestion.model_registry import DEFAULT_MODEL_NAME, get_embedding_model
 import os
-import gc
 import json
+import time
+from datetime import datetime
+from sqlalchemy import select
 from fastembed import TextEmbedding
 
 logger = logging.getLogger(__name__)
 
+# Fields a match card renders; hydration never pulls raw_data or embedding_data
+CARD_COLUMNS = (
+    Grant.id,
+    Grant.title,
+    Grant.description,
+    Grant.agency,
+    Grant.source,
+    Grant.amount_floor,
+    Grant.amount_ceiling,
+    Grant.close_date,
+)
+# Ids per IN (...) list, well under SQLite's bound-parameter limit
+HYDRATE_CHUNK_SIZE = 1000
+
+
+def search_corpus_version(db: Session) -> str:
+    """
+    Version of the corpus ad-hoc searches are answered from: the loaded index's snapshot, or
+    the pgvector corpus stamp. It lags the database exactly as search results do, so search
+    responses are tagged with it rather than with the database stamp.
+    """
+    if pgvector_enabled(db):
+        return pgvector_corpus_version(db)
+    return get_grant_index(db).snapshot_version
+
+
+def _value_bytes(value: Any) -> int:
+    """Rough wire size of one column value, for hydration stats"""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    return len(json.dumps(value, default=str))
+
+
+def fetch_grant_cards(db: Session, grant_ids: List[str], columns=CARD_COLUMNS, stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Load lightweight rows (only the given columns) for many grants with IN (...) queries.
+    Returns {grant_id: row}; fills stats with the query count, rows, bytes and milliseconds.
+    """
+    start = time.perf_counter()
+    grant_ids = list(dict.fromkeys(grant_ids))
+    rows, queries, transferred = {}, 0, 0
+    for offset in range(0, len(grant_ids), HYDRATE_CHUNK_SIZE):
+        chunk = grant_ids[offset:offset + HYDRATE_CHUNK_SIZE]
+        for row in db.execute(select(*columns).where(Grant.id.in_(chunk))):
+            rows[row.id] = row
+            transferred += sum(_value_bytes(value) for value in row)
+        queries += 1
+    if stats is not None:
+        stats.update({
+            "queries": queries,
+            "rows": len(rows),
+            "bytes": transferred,
+            "ms": round((time.perf_counter() - start) * 1000, 2),
+        })
+    return rows
+
 class VectorSearch:
     """Simple vector search implementation using cosine similarity"""
 
-    def __init__(self, model: Optional[TextEmbedding] = None, model_name: str = "BAAI/bge-small-en-v1.5"):
-        if model:
-            self.model = model
-        else:
-            logger.info(f"Loading embedding model: {model_name} (FastEmbed mode)")
-            self.model = TextEmbedding(model_name=model_name)
-            gc.collect()
+    def __init__(self, model: Optional[TextEmbedding] = None, model_name: str = DEFAULT_MODEL_NAME):
+        # The process-wide shared instance unless one is passed in
+        self.model = model or get_embedding_model(model_name)
         self.model_name = model_name
 
     def encode_query(self, query: str) -> np.ndarray:
-        """Encode a search query into an embedding"""
-        # fastembed.embed returns a generator, we take the first result
-        embeddings = list(self.model.embed([query]))
-        return np.array(embeddings[0])
+        """Encode a search query into an embedding (served from the shared query cache when warm)"""
+        return self.encode_queries([query])[0]
+
+    def encode_queries(self, queries: List[str]) -> List[np.ndarray]:
+        """Encode many queries, running the model once for all cache misses"""
+        cache = get_query_cache()
+        vectors = [cache.get(self.model_name, query) for query in queries]
+        missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+        if missing:
+            # The on-disk embedding cache (if configured) is consulted before the model
+            embeddings = embed_with_cache(self.model, self.model_name, missing)
+            encoded = {query: cache.put(self.model_name, query, embedding) for query, embedding in zip(missing, embeddings)}
+            vectors = [encoded[query] if vector is None else vector for query, vector in zip(queries, vectors)]
+        return vectors
 
     def cosine_similarity(self, a: np.ndarray, b: np.ndarray) -> float:
         """Calculate cosine similarity between two vectors with safety check"""
@@ -37,86 +113,97 @@ class VectorSearch:
             return 0.0
         return float(np.dot(a, b) / (norm_a * norm_b))
 
-    def search_grants(self, db: Session, query_embedding: np.ndarray, user_profile: Optional[Dict[str, Any]] = None, top_k: int = 10) -> List[Tuple[Grant, float]]:
+    def search_grants(self, db: Session, query_embedding: np.ndarray, user_profile: Optional[Dict[str, Any]] = None, top_k: int = 10,
+                      diagnostics: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, float]]:
         """
         Search for grants using vector similarity + hybrid categorical scoring.
-        Memory-efficient: Only fetches necessary columns for scoring, then fetches full objects for top results.
+        Scoring runs against the resident in-memory grant index (one matrix-vector product),
+        then the top results are hydrated with a single IN query over CARD_COLUMNS.
+        Grants the user is ineligible for are filtered out before scoring; pass a
+        diagnostics dict to receive the per-filter elimination counts and hydration stats.
+        Results are cached per corpus version (see ResultCache); diagnostics["corpus_version"]
+        receives the search_corpus_version() the results were served from.
+        On PostgreSQL with the embedding_vector column, ranking runs in SQL instead (see
+        ingestion.pgvector_search) and no embeddings are loaded into the process.
         """
-        from sqlalchemy import text
-        
-        # Get necessary columns for scoring to save memory
-        # We fetch ID, embedding, and metadata for boosts
-        grants_data = db.execute(text(
-            "SELECT id, embedding_data, eligible_applicant_types, focus_areas, agency "
-            "FROM grants WHERE embedding_data IS NOT NULL AND status = 'active'"
-        )).fetchall()
-
-        logger.info(f"Hybrid searching through {len(grants_data)} grants")
-
-        scored_results = []
-        user_type = user_profile.get('organization_type') if user_profile else None
-        user_focus = set(user_profile.get('focus_areas', [])) if user_profile else set()
-
-        for row in grants_data:
-            try:
-                grant_id, embedding_json, eligibility, grant_focus, agency = row
-                
-                if not embedding_json:
-                    continue
-                    
-                grant_embedding = np.array(embedding_json)
-                
-                # 1. Semantic Score (Base)
-                base_score = self.cosine_similarity(query_embedding, grant_embedding)
-                
-                # 2. Hybrid Boosts
-                boost = 0.0
-                
-                # Eligibility Boost (e.g., +0.1)
-                if user_type and eligibility:
-                    # Handle both list and string formats from DB
-                    import json
-                    try:
-                        elig_list = eligibility if isinstance(eligibility, list) else json.loads(eligibility)
-                        if user_type in elig_list:
-                            boost += 0.1
-                    except:
-                        if user_type in str(eligibility):
-                            boost += 0.05
-                
-                # Focus Area Match (+0.05 per match, max 0.15)
-                if user_focus and grant_focus:
-                    try:
-                        focus_list = set(grant_focus if isinstance(grant_focus, list) else json.loads(grant_focus))
-                        overlap = user_focus.intersection(focus_list)
-                        boost += min(len(overlap) * 0.05, 0.15)
-                    except:
-                        pass
-                
-                final_score = base_score + boost
-                scored_results.append((grant_id, final_score))
-
-            except Exception as e:
-                logger.warning(f"Error scoring grant {row[0]}: {e}")
-                continue
-
-        # Sort by final score (highest first)
-        scored_results.sort(key=lambda x: x[1], reverse=True)
-        top_scored = scored_results[:top_k]
-
-        # Fetch full Grant objects only for the top results to save memory
-        final_results = []
-        for grant_id, score in top_scored:
-            grant = db.query(Grant).get(grant_id)
-            if grant:
-                final_results.append((grant, score))
-
-        return final_results
-
-    def search_by_text(self, db: Session, query: str, user_profile: Optional[Dict[str, Any]] = None, top_k: int = 10) -> List[Tuple[Grant, float]]:
-        """Search grants by text query with hybrid boosting"""
+        use_pgvector = pgvector_enabled(db)
+        index = None if use_pgvector else get_grant_index(db)
+        cache = get_result_cache()
+        cache_key = result_cache_key(query_embedding, user_profile, top_k)
+        corpus_version = pgvector_corpus_version(db) if use_pgvector else index.corpus_version
+        served_version = pgvector_corpus_version(db) if use_pgvector else index.snapshot_version
+        cached = cache.get(cache_key, corpus_version)
+        if cached is not None:
+            results, filters = cached
+            if diagnostics is not None:
+                diagnostics["result_cache"] = "hit"
+                diagnostics["corpus_version"] = served_version
+                if filters is not None:
+                    diagnostics["eligibility_filters"] = filters
+            return list(results)
+
+        details: Dict[str, Any] = {}
+        if use_pgvector:
+            top_scored = search_pgvector(db, query_embedding, user_profile, top_k, diagnostics=details)
+        else:
+            logger.info(f"Hybrid searching through {len(index)} grants")
+            top_scored = index.search(query_embedding, user_profile, top_k, diagnostics=details)
+
+        hydration: Dict[str, Any] = {}
+        cards = fetch_grant_cards(db, [grant_id for grant_id, _ in top_scored], stats=hydration)
+        logger.info(f"Hydrated {hydration['rows']} grants in {hydration['ms']}ms ({hydration['bytes']} bytes)")
+
+        # Keep the ranked order; grants deleted since the index refresh are dropped
+        results = [(cards[grant_id], score) for grant_id, score in top_scored if grant_id in cards]
+        cache.put(cache_key, corpus_version, (tuple(results), details.get("eligibility_filters")))
+        if diagnostics is not None:
+            diagnostics.update(details)
+            diagnostics["hydration"] = hydration
+            diagnostics["result_cache"] = "miss"
+            diagnostics["corpus_version"] = served_version
+        return results
+
+    def search_by_text(self, db: Session, query: str, user_profile: Optional[Dict[str, Any]] = None, top_k: int = 10,
+                       diagnostics: Optional[Dict[str, Any]] = None) -> List[Tuple[Any, float]]:
+        """Search grants by text query with hybrid boosting; results are (card row, score) pairs"""
         query_embedding = self.encode_query(query)
-        return self.search_grants(db, query_embedding, user_profile, top_k)
+        return self.search_grants(db, query_embedding, user_profile, top_k, diagnostics)
+
+    def search_batch(self, db: Session, queries: List[Union[str, np.ndarray]], user_profiles: Optional[List[Optional[Dict[str, Any]]]] = None,
+                     top_k: int = 10, hydrate: bool = True) -> List[List[Tuple[Any, float]]]:
+        """
+        Search for many queries (query texts or precomputed vectors) in one pass.
+        Texts missing from the query cache are encoded in a single embed call and all
+        queries are scored together against the grant index (or one indexed SQL query each
+        on pgvector); returns one ranked (card row, score) list per query, or
+        (grant_id, score) lists with hydrate=False.
+        """
+        if not queries:
+            return []
+        texts = [q for q in queries if isinstance(q, str)]
+        encoded = iter(self.encode_queries(texts))
+        query_matrix = np.vstack([
+            np.asarray(next(encoded) if isinstance(q, str) else q, dtype=np.float32).ravel()
+            for q in queries
+        ])
+
+        if pgvector_enabled(db):
+            # One indexed SQL query per query vector; PostgreSQL does the heavy lifting
+            profiles = user_profiles or [None] * len(queries)
+            ranked = [search_pgvector(db, vector, profile, top_k) for vector, profile in zip(query_matrix, profiles)]
+        else:
+            index = get_grant_index(db)
+            logger.info(f"Batch searching {len(queries)} queries through {len(index)} grants")
+            ranked = index.search_batch(query_matrix, user_profiles, top_k)
+        if not hydrate:
+            return ranked
+
+        # Hydrate every grant that made any top-k list in a few IN queries
+        grants = fetch_grant_cards(db, [grant_id for scored in ranked for grant_id, _ in scored])
+        return [
+            [(grants[grant_id], score) for grant_id, score in scored if grant_id in grants]
+            for scored in ranked
+        ]
 
 def test_vector_search():
     """Test the vector search functionality"""
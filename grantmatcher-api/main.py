@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -11,13 +11,25 @@ import traceback
 import os
 from datetime import datetime, timezone
 import contextlib
-from fastembed import TextEmbedding
 import numpy as np
 
 from database import get_db
 from models import User, Grant, IngestionRun, TrackedGrant, GrantApplication, MatchFeedback
 from auth import authenticate_user, create_access_token, get_current_user, get_password_hash
-from ingestion.vector_search import VectorSearch
+from http_cache import make_etag, etag_matches, not_modified, set_etag
+from ingestion.vector_search import VectorSearch, search_corpus_version
+from ingestion.grant_index import refresh_grant_index, grant_index_stats
+from ingestion.matching import (
+    build_user_profile, match_explanation, materialize_matches, materialize_all_users,
+    invalidate_matches, read_matches, has_materialized_matches,
+)
+from ingestion.query_cache import get_query_cache
+from ingestion.embedding_cache import get_embedding_cache
+from ingestion.model_registry import get_embedding_model, get_model_registry
+from ingestion.result_cache import get_result_cache
+from ingestion.feedback import get_feedback_cache
+from ingestion.text_search import apply_text_search
+from ingestion.catalog import CATALOG_ORDER, encode_cursor, decode_cursor, after_cursor, get_catalog_totals, corpus_etag_version
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,15 +38,13 @@ logger = logging.getLogger(__name__)
 # Embedding model management
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Load model on startup using fastembed (Torch-free, low memory)
+    # Load model on startup using fastembed (Torch-free, low memory), so no request pays for it.
+    # It is the registry's shared instance: VectorSearch and GrantEmbedder reuse it.
     logger.info("Loading AI embedding model (FastEmbed/ONNX mode)...")
     try:
         # BAAI/bge-small-en-v1.5 is extremely small and accurate (~130MB total RAM)
-        app.state.model = TextEmbedding(model_name="BAAI/bge-small-en-v1.5")
+        app.state.model = get_embedding_model()
         logger.info("AI model loaded successfully using FastEmbed!")
-        
-        # Force garbage collection
-        gc.collect()
     except Exception as e:
         logger.error(f"FAILED to load model: {e}")
         app.state.model = None
@@ -163,7 +173,7 @@ def get_profile(current_user: User = Depends(get_current_user)):
     }
 
 @app.put("/api/profile")
-def update_profile(profile_data: ProfileUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_profile(profile_data: ProfileUpdate, request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Update user profile and regenerate embeddings if mission/focus areas changed"""
     logger.info(f"Updating profile for user {current_user.email}")
     logger.info(f"Data received: {profile_data.dict(exclude_unset=True)}")
@@ -173,12 +183,22 @@ def update_profile(profile_data: ProfileUpdate, current_user: User = Depends(get
         for field, value in profile_data.dict(exclude_unset=True).items():
             if hasattr(current_user, field):
                 setattr(current_user, field, value)
-
-        # If mission statement or focus areas changed, we should regenerate user embedding
-        # For now, we'll just mark that embeddings need updating
-        current_user.embedding_updated_at = datetime.now(timezone.utc)
+        current_user.touch()
 
         db.commit()
+
+        # Rebuild the materialized match list, since boosts and filters may have changed; the
+        # profile vector is only re-embedded if the profile text changed (fingerprint mismatch).
+        # Without a loaded model the list is dropped and rebuilt on the next /api/matches call.
+        model = getattr(request.app.state, 'model', None)
+        try:
+            if model is not None:
+                materialize_matches(db, [current_user], VectorSearch(model=model))
+            else:
+                invalidate_matches(db, current_user)
+        except Exception as e:
+            logger.warning(f"Could not refresh profile embedding/matches for {current_user.email}: {e}")
+            db.rollback()
         db.refresh(current_user)
         logger.info(f"Profile updated successfully for {current_user.email}")
 
@@ -218,22 +238,47 @@ def trigger_ingestion(limit: int = 100, current_user: User = Depends(get_current
         ingester = GrantsGovIngester()
         stats = ingester.ingest_grants(db, limit=limit)
         
-        # Generate embeddings for any new/updated grants
+        # Generate embeddings for any new/updated grants (with the shared model loaded at startup)
         embedder = GrantEmbedder()
-        embed_stats = embedder.generate_embeddings(db, limit=limit)
+        embed_stats = embedder.embed_all_grants(db)
+
+        # Publish a fresh shared embedding store for other workers, if one is configured
+        from ingestion.embedding_store import build_embedding_store, STORE_DIR
+        if STORE_DIR:
+            build_embedding_store(db, STORE_DIR)
+
+        # Make the new/updated grants visible to search immediately
+        refresh_grant_index(db)
+
+        # Re-rank every user's materialized matches against the updated corpus
+        match_stats = materialize_all_users(db, VectorSearch(model=embedder.model))
         
         return {
             "message": "Ingestion complete",
             "ingestion_stats": stats,
-            "embedding_stats": embed_stats
+            "embedding_stats": embed_stats,
+            "match_stats": match_stats
         }
     except Exception as e:
         logger.error(f"Ingestion failed: {e}")
         raise HTTPException(status_code=500, detail=f"Ingestion failed: {str(e)}")
 
+@app.post("/api/admin/index/refresh")
+def trigger_index_refresh(full: bool = False, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Force a refresh of the in-memory grant search index (Admin only)"""
+    if current_user.email not in ["admin@grantmatcher.ai", "athar@example.com"]:  # Example admin emails
+        raise HTTPException(status_code=403, detail="Only administrators can refresh the search index")
+
+    try:
+        stats = refresh_grant_index(db, full=full)
+        return {"message": "Index refreshed", "index_stats": stats}
+    except Exception as e:
+        logger.error(f"Index refresh failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Index refresh failed: {str(e)}")
+
 @app.get("/api/admin/stats")
-def get_admin_stats(db: Session = Depends(get_db)):
-    """Get system statistics for admin dashboard"""
+def get_admin_stats(measure: bool = False, db: Session = Depends(get_db)):
+    """Get system statistics for admin dashboard (measure=true also re-measures search index recall)"""
     # User stats
     total_users = db.query(func.count(User.id)).scalar()
     active_users = db.query(func.count(User.id)).filter(User.last_login.isnot(None)).scalar()
@@ -242,7 +287,7 @@ def get_admin_stats(db: Session = Depends(get_db)):
     total_grants = db.query(func.count(Grant.id)).scalar()
     active_grants = db.query(func.count(Grant.id)).filter(Grant.status == 'active').scalar()
     grants_with_embeddings = db.query(func.count(Grant.id)).filter(
-        Grant.embedding_data.isnot(None)
+        Grant.has_embedding
     ).scalar()
 
     # Ingestion stats
@@ -271,83 +316,110 @@ def get_admin_stats(db: Session = Depends(get_db)):
                 "completed_at": latest_ingestion.completed_at.isoformat() if latest_ingestion and latest_ingestion.completed_at else None,
                 "grants_fetched": latest_ingestion.grants_fetched if latest_ingestion else 0
             } if latest_ingestion else None
-        }
+        },
+        "search_index": grant_index_stats(measure=measure),
+        "query_cache": get_query_cache().stats(),
+        "result_cache": get_result_cache().stats(),
+        "catalog_totals": get_catalog_totals().stats(),
+        "feedback_cache": get_feedback_cache().stats(),
+        "embedding_cache": get_embedding_cache().stats() if get_embedding_cache() else None,
+        "embedding_models": get_model_registry().stats()
+    }
+
+def format_match(grant, score: float, explanation: str, is_new: Optional[bool] = None) -> Dict:
+    """Match card for /api/matches from a card row (see CARD_COLUMNS)"""
+    # Safety check for NaN or non-serializable float values
+    try:
+        s = float(score)
+        if np.isnan(s) or np.isinf(s):
+            s = 0.0
+    except:
+        s = 0.0
+
+    match = {
+        "id": grant.id,
+        "title": grant.title,
+        "description": grant.description[:200] + "..." if grant.description and len(grant.description) > 200 else (grant.description or ""),
+        "agency": grant.agency,
+        "source": grant.source,
+        "amount_floor": grant.amount_floor,
+        "amount_ceiling": grant.amount_ceiling,
+        "close_date": grant.close_date.isoformat() if grant.close_date else None,
+        "score": round(s, 3),
+        "explanation": explanation
     }
+    if is_new is not None:
+        match["is_new"] = is_new
+    return match
 
 @app.get("/api/matches")
 def get_matches(
     request: Request,
+    response: Response,
     q: str = None,
+    cursor: Optional[int] = None,
+    limit: int = 10,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get grant matches for the current user, optionally with ad-hoc search"""
+    """
+    Get grant matches for the current user, optionally with ad-hoc search.
+    Profile matches are read from the materialized match_results list, paginated by
+    passing the returned next_cursor back as cursor.
+    """
     try:
-        if q:
-            # Ad-hoc search with provided query
-            query = q
-        else:
-            # Create search query from user profile
-            query_parts = []
-            
-            # Safe attribute access
-            for attr in ['mission_statement', 'organization_name']:
-                val = getattr(current_user, attr, None)
-                if val:
-                    query_parts.append(val)
-            
-            # Handle list attributes
-            focus_areas = getattr(current_user, 'focus_areas', None)
-            if focus_areas and isinstance(focus_areas, list):
-                query_parts.extend(focus_areas)
-
-            if not query_parts:
-                return {"matches": [], "message": "Please complete your profile to get matches"}
-
-            query = " ".join(query_parts)
-
-        # Perform hybrid vector search
+        limit = max(1, min(limit, 100))
+        # Matches also depend on the day (closed grants drop out), not just corpus and profile
+        etag_parts = (current_user.data_version, q, cursor, limit, datetime.now(timezone.utc).date())
+        # Ad-hoc results come from the search index, which lags the database between
+        # refreshes: tag them with the version the index serves, not the database stamp
+        corpus_version = search_corpus_version(db) if q else corpus_etag_version(db)
+        etag = make_etag("matches", corpus_version, *etag_parts)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+
         model = getattr(request.app.state, 'model', None)
+
+        if not q:
+            # Dashboard: a single indexed read of the precomputed ranked list
+            rows, next_cursor = read_matches(db, current_user, cursor, limit)
+            if not rows and not cursor and not has_materialized_matches(db, current_user):
+                # First visit (or profile just changed): materialize this user's list now
+                stats = materialize_matches(db, [current_user], VectorSearch(model=model))
+                if not stats["users"]:
+                    return {"matches": [], "message": "Please complete your profile to get matches"}
+                rows, next_cursor = read_matches(db, current_user, cursor, limit)
+
+            matches = [format_match(row, row.score, row.explanation, row.is_new) for row in rows]
+            get_result_cache().record_request("materialized")
+            logger.info(f"Returning {len(matches)} materialized matches")
+            return {"matches": matches, "next_cursor": next_cursor}
+
+        # Ad-hoc search with provided query
         search = VectorSearch(model=model)
+        logger.info(f"Querying VectorSearch for: {q[:50]}...")
+        query_embedding = search.encode_query(q)
+
+        # Prepare user profile for boosting, hard filters and feedback rescoring
+        user_profile = build_user_profile(current_user, get_feedback_cache().get(db, current_user.id))
         
-        # Prepare user profile for boosting
-        user_profile = {
-            "organization_type": current_user.organization_type,
-            "focus_areas": current_user.focus_areas,
-            "annual_budget": current_user.annual_budget
-        }
-        
-        # search_by_text now returns List[Tuple[Grant, float]] where Grant is the full object
-        logger.info(f"Querying VectorSearch for: {query[:50]}...")
-        results = search.search_by_text(db, query, user_profile=user_profile, top_k=10)
+        # search_grants returns List[Tuple[row, float]]; rows carry only the card fields rendered below
+        diagnostics = {}
+        results = search.search_grants(db, query_embedding, user_profile=user_profile, top_k=limit, diagnostics=diagnostics)
         logger.info(f"VectorSearch returned {len(results)} results")
-
-        # Format results (VectorSearch already fetched the objects efficiently)
-        matches = []
-        for i, (grant, score) in enumerate(results):
-            # Safety check for NaN or non-serializable float values
-            try:
-                s = float(score)
-                if np.isnan(s) or np.isinf(s):
-                    s = 0.0
-            except:
-                s = 0.0
-                
-            matches.append({
-                "id": grant.id,
-                "title": grant.title,
-                "description": grant.description[:200] + "..." if grant.description and len(grant.description) > 200 else (grant.description or ""),
-                "agency": grant.agency,
-                "source": grant.source,
-                "amount_floor": grant.amount_floor,
-                "amount_ceiling": grant.amount_ceiling,
-                "close_date": grant.close_date.isoformat() if grant.close_date else None,
-                "score": round(s, 3),
-                "explanation": f"Matches your {'search' if q else 'mission'} with {round(s * 100, 1)}% relevance"
-            })
+        get_result_cache().record_request("result_cache" if diagnostics.get("result_cache") == "hit" else "live")
+        if "eligibility_filters" in diagnostics:
+            logger.info(f"Hard filters for user {current_user.id}: {diagnostics['eligibility_filters']}")
+        if diagnostics.get("corpus_version", corpus_version) != corpus_version:
+            # The index refreshed between tagging and searching
+            set_etag(response, make_etag("matches", diagnostics["corpus_version"], *etag_parts))
+
+        # Format results (VectorSearch already fetched the card fields in one query)
+        matches = [format_match(grant, score, match_explanation(score, "search")) for grant, score in results]
         
         logger.info(f"Returning {len(matches)} formatted matches")
-        return {"matches": matches}
+        return {"matches": matches, "eligibility_filters": diagnostics.get("eligibility_filters")}
     except Exception as e:
         logger.error(f"Error in get_matches: {e}")
         traceback.print_exc()
@@ -358,32 +430,56 @@ def get_matches(
 
 @app.get("/api/grants")
 def get_grants(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     q: str = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get a list of all grants, optionally filtered by search query"""
-    query = db.query(Grant).filter(Grant.status == 'active')
+    """
+    Get a list of all grants, optionally filtered by search query.
+    Pages in catalog order carry a next_cursor; passing it back as cursor continues after
+    the last grant without an OFFSET scan (skip still works for older clients).
+    """
+    corpus_version = corpus_etag_version(db)
+    etag = make_etag("grants", corpus_version, skip, limit, q, cursor)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
 
-    if q and q.strip():
-        # Simple text search in title and description
-        search_term = f"%{q.strip()}%"
-        query = query.filter(
-            (Grant.title.ilike(search_term)) |
-            (Grant.description.ilike(search_term)) |
-            (Grant.agency.ilike(search_term))
-        )
+    query = db.query(Grant).filter(Grant.status == 'active')
 
-    # Order by close date (upcoming first), then by title
-    query = query.order_by(
-        Grant.close_date.asc().nulls_last(),
-        Grant.title.asc()
-    )
+    # Full-text search ranks by relevance; without an FTS index fall back to substring matching
+    searched = apply_text_search(db, query, q) if q and q.strip() else None
+    if searched is not None:
+        query = searched
+    else:
+        if q and q.strip():
+            search_term = f"%{q.strip()}%"
+            query = query.filter(
+                (Grant.title.ilike(search_term)) |
+                (Grant.description.ilike(search_term)) |
+                (Grant.agency.ilike(search_term))
+            )
 
-    total = query.count()
-    grants = query.offset(skip).limit(limit).all()
+        # Order by close date (upcoming first), then by title; id keeps the order total for cursors
+        query = query.order_by(*CATALOG_ORDER)
+
+    # Counted once per search string and corpus version, not on every page
+    total = get_catalog_totals().get(corpus_version, q, lambda: query.order_by(None).count())
+    # Relevance-ranked results have no stable key to continue from, so they page by offset
+    keyset = searched is None
+    if cursor and keyset:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        grants = after_cursor(query, position).limit(limit).all()
+    else:
+        grants = query.offset(skip).limit(limit).all()
 
     # Format results
     grant_list = []
@@ -405,12 +501,18 @@ def get_grants(
         "grants": grant_list,
         "total": total,
         "skip": skip,
-        "limit": limit
+        "limit": limit,
+        "next_cursor": encode_cursor(grants[-1]) if keyset and grants and len(grants) == limit else None
     }
 
 @app.get("/api/grants/{grant_id}")
-def get_grant_detail(grant_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_grant_detail(grant_id: str, request: Request, response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get detailed information for a specific grant"""
+    etag = make_etag("grant", corpus_etag_version(db), grant_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     grant = db.query(Grant).filter(Grant.id == grant_id).first()
     if not grant:
         raise HTTPException(status_code=404, detail="Grant not found")
@@ -464,6 +566,7 @@ def save_grant(grant_id: str, current_user: User = Depends(get_current_user), db
         grant_id=grant_id
     )
     db.add(tracked_grant)
+    current_user.touch()
     db.commit()
     db.refresh(tracked_grant)
 
@@ -481,13 +584,19 @@ def unsave_grant(grant_id: str, current_user: User = Depends(get_current_user),
         raise HTTPException(status_code=404, detail="Grant not saved")
 
     db.delete(tracked_grant)
+    current_user.touch()
     db.commit()
 
     return {"message": "Grant removed from saved grants"}
 
 @app.get("/api/saved-grants")
-def get_saved_grants(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_saved_grants(request: Request, response: Response, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Get all grants saved by the current user"""
+    etag = make_etag("saved-grants", corpus_etag_version(db), current_user.data_version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+
     saved_grants = db.query(TrackedGrant, Grant).join(
         Grant, TrackedGrant.grant_id == Grant.id
     ).filter(
@@ -676,6 +785,7 @@ class FeedbackCreate(BaseModel):
 @app.post("/api/matches/feedback")
 def submit_feedback(
     feedback: FeedbackCreate,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -706,6 +816,19 @@ def submit_feedback(
     )
 
     db.add(feedback_record)
+    current_user.touch()
     db.commit()
 
+    # Re-rank with the new feedback (dismissed grants and their look-alikes drop, saved ones lift)
+    get_feedback_cache().invalidate(current_user.id)
+    model = getattr(request.app.state, 'model', None)
+    try:
+        if model is not None:
+            materialize_matches(db, [current_user], VectorSearch(model=model))
+        else:
+            invalidate_matches(db, current_user)
+    except Exception as e:
+        logger.warning(f"Could not refresh matches after feedback for {current_user.email}: {e}")
+        db.rollback()
+
     return {"message": "Feedback submitted successfully"}
\ No newline at end of file
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, JSON, ForeignKey, Float, func
+from sqlalchemy import Column, String, Integer, Text, DateTime, Boolean, JSON, ForeignKey, Float, LargeBinary, Index, func, or_
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.ext.declarative import declarative_base
 import uuid
 
@@ -24,13 +25,26 @@ class User(Base):
     email_preferences = Column(JSON, default=lambda: {"digest_enabled": True, "digest_day": "monday", "timezone": "America/New_York"})
     subscription_plan = Column(String(20), default="free")
     stripe_customer_id = Column(String(100))
-    # embedding = Column(JSON)  # Store as JSON for SQLite
+    embedding = Column(LargeBinary)  # Profile vector, see ingestion/vector_codec.py
+    embedding_fingerprint = Column(String(64))  # sha256 of the model + profile text that produced it
+    embedding_model = Column(String(100))
     embedding_updated_at = Column(DateTime)
     created_at = Column(DateTime, default=func.now())
     last_login = Column(DateTime)
+    data_version = Column(Integer, nullable=False, default=0)  # Bumped when profile, saved grants or matches change (ETags)
+
+    def touch(self):
+        """Mark this user's data as changed so cached responses (ETags) are revalidated"""
+        self.data_version = (self.data_version or 0) + 1
 
 class Grant(Base):
+    # Database-maintained search structures live outside the ORM: grants.embedding_vector
+    # (pgvector) and grants.search_vector / grants_fts (full text), see the migrations
     __tablename__ = "grants"
+    __table_args__ = (
+        # Keyset pagination of the active catalog: close_date, title, id (see ingestion.catalog)
+        Index("ix_grants_catalog_order", "status", "close_date", "title", "id"),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     source = Column(String(20), nullable=False)
     source_id = Column(String(100), nullable=False)
@@ -54,16 +68,31 @@ class Grant(Base):
     geographic_scope = Column(String(50), default="national")
     status = Column(String(20), default="active")
     raw_data = Column(JSON)
-    embedding_data = Column(JSON)  # Store embeddings as JSON for SQLite
+    embedding = Column(LargeBinary)  # Grant vector, see ingestion/vector_codec.py
+    embedding_data = Column(JSON(none_as_null=True))  # Legacy JSON vector, only read for rows not yet converted to embedding
+    embedding_fingerprint = Column(String(64))  # sha256 of the model + grant text that produced it
     embedding_model = Column(String(100))
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now())
 
+    @hybrid_property
+    def has_embedding(self):
+        return self.embedding is not None or self.embedding_data is not None
+
+    @has_embedding.expression
+    def has_embedding(cls):
+        return or_(cls.embedding.isnot(None), cls.embedding_data.isnot(None))
+
 class MatchResult(Base):
     __tablename__ = "match_results"
+    __table_args__ = (
+        # Dashboard reads are a range scan over one user's ranked list
+        Index("ix_match_results_user_rank", "user_id", "rank"),
+    )
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String(36), ForeignKey("users.id", ondelete="CASCADE"))
     grant_id = Column(String(36), ForeignKey("grants.id", ondelete="CASCADE"))
+    rank = Column(Integer, nullable=False, default=0)  # 1-based position in the user's ranked list
     score = Column(Float, nullable=False)
     semantic_similarity = Column(Float, nullable=False)
     eligibility_bonus = Column(Float, default=0)
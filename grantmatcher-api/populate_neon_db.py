@@ -95,7 +95,7 @@ def main():
         print("=" * 70)
         
         embedder = GrantEmbedder()
-        embedding_stats = embedder.embed_all_grants(db, batch_size=10)
+        embedding_stats = embedder.embed_all_grants(db)
         
         print(f"\n✓ Embeddings generated successfully!")
         print(f"  - Processed: {embedding_stats['processed']} grants")
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import time
+
+# A throwaway SQLite database, set before the app modules create their engine
+WORKDIR = tempfile.mkdtemp(prefix="grant-embeddings-")
+DB_PATH = os.path.join(WORKDIR, "grants.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+import numpy as np
+from sqlalchemy import func, select, update
+from database import SessionLocal
+from models import Grant
+from ingestion.grant_index import GrantIndex
+from ingestion.vector_codec import encode_vector
+
+DIM = 384
+
+
+def seed(db, n: int):
+    """n active grants with random JSON embeddings, as written before the binary column existed"""
+    rng = np.random.default_rng(0)
+    for start in range(0, n, 1000):
+        db.add_all([
+            Grant(
+                source="profile", source_id=str(i), title=f"Grant {i}", description="", status="active",
+                embedding_data=rng.normal(size=DIM).astype(np.float32).tolist(), embedding_model="profile",
+            )
+            for i in range(start, min(start + 1000, n))
+        ])
+        db.commit()
+
+
+def convert(db):
+    """Move every JSON embedding to the binary column (what the migration does)"""
+    rows = db.execute(select(Grant.id, Grant.embedding_data).where(Grant.embedding_data.isnot(None))).all()
+    for start in range(0, len(rows), 1000):
+        db.execute(update(Grant), [
+            {"id": row.id, "embedding": encode_vector(np.asarray(row.embedding_data, dtype=np.float32)), "embedding_data": None}
+            for row in rows[start:start + 1000]
+        ])
+        db.commit()
+    db.connection().exec_driver_sql("VACUUM")
+
+
+def measure(db, label: str, runs: int = 3) -> GrantIndex:
+    column_bytes = db.execute(
+        select(func.avg(func.coalesce(func.length(Grant.embedding), 0) + func.coalesce(func.length(Grant.embedding_data), 0)))
+    ).scalar()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        index = GrantIndex.build(db)
+        timings.append(time.perf_counter() - start)
+    print(
+        f"{label:7s} {column_bytes:8.0f} bytes/grant  file {os.path.getsize(DB_PATH) / 1e6:7.1f} MB  "
+        f"index load {np.median(timings) * 1000:8.1f} ms ({len(index)} grants)"
+    )
+    return index
+
+
+def profile_embedding_storage(n: int = 20000):
+    """Storage size and corpus load time of JSON vs binary float32 grant embeddings"""
+    db = SessionLocal()
+    try:
+        seed(db, n)
+        db.connection().exec_driver_sql("VACUUM")
+        before = measure(db, "JSON")
+        convert(db)
+        after = measure(db, "binary")
+        query = np.random.default_rng(1).normal(size=DIM)
+        same = before.search(query, None, 50) == after.search(query, None, 50)
+        print(f"Identical top-50 results: {same}")
+    finally:
+        db.close()
+        os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    profile_embedding_storage(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,38 @@
+import time
+import numpy as np
+from database import get_db
+from models import Grant
+from ingestion.grant_index import get_grant_index
+from ingestion.vector_search import fetch_grant_cards, _value_bytes
+
+def profile_hydration(top_k: int = 10, runs: int = 20):
+    """Compare per-id ORM hydration of top-k results with one projected IN query"""
+    db = next(get_db())
+    try:
+        index = get_grant_index(db)
+        rng = np.random.default_rng(0)
+        per_row_ms, per_row_bytes, bulk_ms, bulk_bytes = [], [], [], []
+        for _ in range(runs):
+            grant_ids = [grant_id for grant_id, _ in index.search(rng.normal(size=index.dim), top_k=top_k)]
+
+            db.expunge_all()
+            start = time.perf_counter()
+            grants = [db.get(Grant, grant_id) for grant_id in grant_ids]
+            per_row_ms.append((time.perf_counter() - start) * 1000)
+            per_row_bytes.append(sum(
+                _value_bytes(getattr(g, column.key)) for g in grants if g for column in Grant.__table__.columns
+            ))
+
+            db.expunge_all()
+            stats = {}
+            fetch_grant_cards(db, grant_ids, stats=stats)
+            bulk_ms.append(stats["ms"])
+            bulk_bytes.append(stats["bytes"])
+
+        print(f"Per-row get():    {np.median(per_row_ms):.2f} ms, {int(np.median(per_row_bytes))} bytes, {top_k} queries per request")
+        print(f"Projected IN (): {np.median(bulk_ms):.2f} ms, {int(np.median(bulk_bytes))} bytes, 1 query per request")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    profile_hydration()
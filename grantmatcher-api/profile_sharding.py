@@ -0,0 +1,63 @@
+import sys
+import time
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from ingestion import grant_index
+from ingestion.grant_index import GrantIndex, _normalize_rows
+from ingestion.grant_features import FEATURE_COLUMNS
+
+FeatureRow = namedtuple("FeatureRow", [column.key for column in FEATURE_COLUMNS])
+PROFILE = {"organization_type": "nonprofit", "focus_areas": ["health", "education"]}
+
+
+def synthetic_index(n: int, dim: int = 384, seed: int = 0) -> GrantIndex:
+    """Index of n random grants; features repeat a small pool of varied rows"""
+    rng = np.random.default_rng(seed)
+    index = GrantIndex(dim)
+    index.vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100000):
+        block = rng.standard_normal((min(100000, n - start), dim), dtype=np.float32)
+        index.vectors[start:start + block.shape[0]] = _normalize_rows(block)
+    index.ids = [f"grant-{i}" for i in range(n)]
+    index.positions = {grant_id: i for i, grant_id in enumerate(index.ids)}
+    index.alive = np.ones(n, dtype=bool)
+    index.cells = np.zeros(n, dtype=np.int32)
+
+    focus = ["health", "education", "environment", "energy", "arts"]
+    types = [["nonprofit"], ["small_business"], ["individual"], []]
+    pool = [
+        FeatureRow(types[i % 4], focus[i % 5:i % 5 + 2], f"Agency {i % 7}", None, None, None, None)
+        for i in range(1000)
+    ]
+    index.features.append(pool)
+    index.features.take(np.arange(n) % len(pool))
+    return index
+
+
+def profile_sharding(sizes=(100000, 1000000), shard_counts=(1, 2, 4, 8), top_k: int = 10, runs: int = 20):
+    """Median exact-search latency per shard count (one worker per shard) for each corpus size"""
+    for n in sizes:
+        index = synthetic_index(n)
+        queries = np.random.default_rng(1).standard_normal((runs, index.dim))
+        grant_index.SHARD_MIN_GRANTS = 0
+        baseline = None
+        for shards in shard_counts:
+            grant_index.SEARCH_SHARDS = shards
+            grant_index._pool = ThreadPoolExecutor(max_workers=shards)
+            index.search(queries[0], PROFILE, top_k)  # warm up the pool
+            timings = []
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, PROFILE, top_k)
+                timings.append((time.perf_counter() - start) * 1000)
+            grant_index._pool.shutdown()
+            median = float(np.median(timings))
+            baseline = baseline or median
+            print(f"{n:>8} grants, {shards} shard(s): {median:8.2f} ms  ({baseline / median:.2f}x)")
+        del index
+
+
+if __name__ == "__main__":
+    sizes = tuple(int(arg) for arg in sys.argv[1:]) or (100000, 1000000)
+    profile_sharding(sizes)
@@ -14,7 +14,7 @@ def verify():
     try:
         total = db.query(Grant).count()
         active = db.query(Grant).filter(Grant.status == 'active').count()
-        no_emb = db.query(Grant).filter(Grant.embedding_data == None).count()
+        no_emb = db.query(Grant).filter(~Grant.has_embedding).count()
         
         # Breakdown by source
         from sqlalchemy import func